@@ -0,0 +1,123 @@
+import difflib
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from api.cache import get_version
+from recipes.models import Ingredient
+
+FUZZY_MIN_LENGTH = 4
+FUZZY_CUTOFF = 0.6
+
+
+def normalize(name):
+    return ' '.join(name.casefold().split())
+
+
+class IngredientIndex:
+    """In-process sorted index of ingredient names.
+
+    Matches are ranked as name prefix first, then word prefix, then any
+    substring; close fuzzy matches are returned only when nothing else
+    matched. Every worker keeps its own copy and rebuilds it from the
+    database when the 'ingredients' version in the shared cache changes,
+    including after `import_data` runs in another process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.keys = ()
+        self.ingredients = ()
+
+    def load(self):
+        version = get_version('ingredients')
+        if version == self.version:
+            return self.keys, self.ingredients
+        with self.lock:
+            if version != self.version:
+                ingredients = sorted(
+                    Ingredient.objects.all(),
+                    key=lambda ingredient: normalize(ingredient.name),
+                )
+                self.keys, self.ingredients = (
+                    tuple(normalize(item.name) for item in ingredients),
+                    tuple(ingredients),
+                )
+                self.version = version
+        return self.keys, self.ingredients
+
+    def candidates(self, keys, query):
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            yield position
+            position += 1
+
+        word_query = ' ' + query
+        substrings = []
+        for position, key in enumerate(keys):
+            if word_query in key:
+                yield position
+            elif query in key:
+                substrings.append(position)
+        yield from substrings
+
+    def fuzzy(self, keys, query, limit):
+        # Typos rarely hit the first letter, so only names sharing it are
+        # compared, which keeps difflib to a small slice of the index.
+        start = bisect_left(keys, query[0])
+        end = bisect_left(keys, chr(ord(query[0]) + 1))
+        positions = {keys[index]: index for index in range(start, end)}
+        return [
+            positions[key]
+            for key in difflib.get_close_matches(
+                query, positions, n=limit, cutoff=FUZZY_CUTOFF,
+            )
+        ]
+
+    def search(self, name, limit):
+        keys, ingredients = self.load()
+        query = normalize(name)
+        found = []
+        for position in self.candidates(keys, query):
+            if position not in found:
+                found.append(position)
+                if len(found) >= limit:
+                    break
+        if not found and len(query) >= FUZZY_MIN_LENGTH:
+            found = self.fuzzy(keys, query, limit)
+        return [ingredients[position] for position in found]
+
+
+class DatabaseIngredientSearch:
+    """Case-insensitive name prefix matches first, then substrings.
+
+    The prefix tier is served by the UPPER(name) pattern index; the
+    substring tier scans the table and only runs when prefixes leave
+    room on the page.
+    """
+
+    def search(self, name, limit):
+        query = normalize(name)
+        found = list(Ingredient.objects.filter(
+            name__istartswith=query,
+        ).order_by('name')[:limit])
+        if len(found) < limit:
+            found += Ingredient.objects.filter(
+                name__icontains=query,
+            ).exclude(
+                name__istartswith=query,
+            ).order_by('name')[:limit - len(found)]
+        return found
+
+
+_engine = None
+
+
+def get_search_engine():
+    global _engine
+    if _engine is None:
+        _engine = import_string(settings.INGREDIENT_SEARCH_ENGINE)()
+    return _engine
@@ -0,0 +1,40 @@
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Shared token that changes whenever the named data set changes.
+
+    Process-local tables and indexes compare it with the token they were
+    loaded at, so the cache backend has to be shared by every worker.
+    """
+    return cache.get_or_set(version_key(name), lambda: uuid4().hex, None)
+
+
+def bump_version(name):
+    cache.set(version_key(name), uuid4().hex, None)
+
+
+def recipe_list_cache_key(request):
+    """Key of an anonymous recipe list page.
+
+    Any recipe, tag, ingredient or user change moves one of the versions
+    and so orphans every cached page at once. Recipe saves and deletes
+    move the 'recipes' version through the model signals.
+    """
+    params = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+    versions = ':'.join(
+        get_version(name)
+        for name in ('recipes', 'ingredients', 'tags', 'users')
+    )
+    return f'recipes_list:{versions}:{request.get_host()}:{params}'
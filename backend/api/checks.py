@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_MEMORY_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Version tokens only invalidate other workers through a shared cache."""
+    if settings.DEBUG:
+        return []
+    return [
+        Warning(
+            f'The {alias!r} cache is kept in the memory of each process.',
+            hint=(
+                'Cached data and the versions invalidating it are not '
+                'shared between workers. Use a file, Memcached or Redis '
+                'cache unless the site runs a single worker.'
+            ),
+            obj=alias,
+            id='api.W001',
+        )
+        for alias, config in settings.CACHES.items()
+        if config['BACKEND'] == LOCAL_MEMORY_CACHE
+    ]
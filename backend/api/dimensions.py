@@ -0,0 +1,59 @@
+import threading
+
+from api.cache import get_version
+from recipes.models import Ingredient, Tag
+
+
+class DimensionTable:
+    """Process-local copy of a small, rarely changing table.
+
+    Rows are kept as dicts keyed by id, in the model's default ordering,
+    and reloaded whenever the shared version of the table changes, so
+    serializers can resolve ids without joining or prefetching the table.
+    """
+
+    def __init__(self, model, version_name, fields):
+        self.model = model
+        self.version_name = version_name
+        self.fields = fields
+        self.lock = threading.Lock()
+        self.version = None
+        self.state = ({}, {})
+
+    def load(self, force=False):
+        """Rows by id and their positions in the default ordering."""
+        version = get_version(self.version_name)
+        if version == self.version and not force:
+            return self.state
+        with self.lock:
+            if version != self.version or force:
+                rows = {
+                    row['id']: row
+                    for row in self.model.objects.values(*self.fields)
+                }
+                self.state = rows, {
+                    id: position for position, id in enumerate(rows)
+                }
+                self.version = version
+        return self.state
+
+    def get_many(self, ids):
+        """Rows with the given ids, by id, in the default ordering.
+
+        A row created in another process may be seen before its version
+        bump arrives, so unknown ids trigger one forced reload.
+        """
+        rows, positions = self.load()
+        ids = set(ids)
+        if not rows.keys() >= ids:
+            rows, positions = self.load(force=True)
+        return {
+            id: rows[id]
+            for id in sorted(ids & rows.keys(), key=positions.get)
+        }
+
+
+tags = DimensionTable(Tag, 'tags', ('id', 'name', 'color', 'slug'))
+ingredients = DimensionTable(
+    Ingredient, 'ingredients', ('id', 'name', 'measurement_unit'),
+)
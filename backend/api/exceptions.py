@@ -37,3 +37,21 @@ class NotFollowingException(APIException):
     status_code = HTTPStatus.BAD_REQUEST
     default_code = 'not_following'
     default_detail = 'Not following the user.'
+
+
+class UnknownFileFormatException(APIException):
+    status_code = HTTPStatus.BAD_REQUEST
+    default_code = 'unknown_file_format'
+    default_detail = 'Unknown file format, use one of: txt, csv, json.'
+
+
+class InvalidIdsException(APIException):
+    status_code = HTTPStatus.BAD_REQUEST
+    default_code = 'invalid_ids'
+    default_detail = 'Ids must be integers.'
+
+
+class PayloadTooLargeException(APIException):
+    status_code = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    default_code = 'payload_too_large'
+    default_detail = 'Request body is too large.'
@@ -0,0 +1,144 @@
+from collections import defaultdict
+
+from api import images
+from api.dimensions import ingredients, tags
+from recipes.models import Recipe
+
+
+def resolve_subscriptions(recipes, request_user):
+    """Set `author.is_subscribed` on every recipe with a single query."""
+    followed = set()
+    if request_user.is_authenticated and recipes:
+        followed = set(request_user.following.filter(
+            author__in={recipe.author_id for recipe in recipes},
+        ).values_list('author', flat=True))
+    for recipe in recipes:
+        recipe.author.is_subscribed = recipe.author_id in followed
+
+
+def image_url(image, request):
+    if not image:
+        return None
+    if request is None:
+        return image.url
+    return request.build_absolute_uri(image.url)
+
+
+def is_subscribed(author, request_user):
+    if hasattr(author, 'is_subscribed'):
+        return author.is_subscribed
+    if not request_user.is_authenticated:
+        return False
+    return author.followers.filter(user=request_user).exists()
+
+
+class FastSerializer:
+    """Read-only serializer building plain dicts from prefetched objects.
+
+    Subclasses produce exactly what their DRF counterparts produce,
+    without the per-field machinery that dominates CPU time on list
+    pages; `benchmark_serializers` checks that the outputs are equal.
+    Only the part of the serializer interface the views use is offered.
+    """
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        if not self.many:
+            return self.to_list([self.instance], request)[0]
+        instances = self.instance
+        if hasattr(instances, 'all'):
+            instances = instances.all()
+        return self.to_list(list(instances), request)
+
+    def to_list(self, instances, request):
+        return [
+            self.to_representation(instance, request)
+            for instance in instances
+        ]
+
+
+class FastRecipeShortSerializer(FastSerializer):
+
+    def to_representation(self, recipe, request):
+        return {
+            'id': recipe.id,
+            'name': recipe.name,
+            'image': image_url(recipe.image, request),
+            'image_variants': images.variant_urls(recipe, request),
+            'cooking_time': recipe.cooking_time,
+        }
+
+
+class FastRecipeSerializer(FastSerializer):
+    """Tags and ingredients come from the in-process dimension tables.
+
+    Only the recipe-tag and recipe-ingredient rows are read from the
+    database; names, colors and units are resolved by id.
+    """
+
+    def to_list(self, recipes, request):
+        resolve_subscriptions(recipes, request.user)
+        recipe_tags = defaultdict(set)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe__in=[recipe.id for recipe in recipes],
+        ).values_list('recipe', 'tag'):
+            recipe_tags[recipe_id].add(tag_id)
+        self.recipe_tags = recipe_tags
+        self.tags = tags.get_many(
+            tag_id for ids in recipe_tags.values() for tag_id in ids
+        )
+        self.ingredients = ingredients.get_many(
+            item.ingredient_id
+            for recipe in recipes
+            for item in recipe.recipeingredient_set.all()
+        )
+        return super().to_list(recipes, request)
+
+    def get_ingredient(self, item):
+        row = self.ingredients.get(item.ingredient_id)
+        if row is None:
+            ingredient = item.ingredient
+            row = {
+                'id': ingredient.id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+            }
+        return {**row, 'amount': item.amount}
+
+    def to_representation(self, recipe, request):
+        author = recipe.author
+        recipe_tags = self.recipe_tags[recipe.id]
+        return {
+            'id': recipe.id,
+            'tags': [
+                dict(row) for id, row in self.tags.items()
+                if id in recipe_tags
+            ],
+            'author': {
+                'email': author.email,
+                'id': author.id,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+                'is_subscribed': is_subscribed(author, request.user),
+            },
+            'ingredients': [
+                self.get_ingredient(item)
+                for item in recipe.recipeingredient_set.all()
+            ],
+            'is_favorited': bool(getattr(recipe, 'is_favorited', False)),
+            'is_in_shopping_cart': bool(
+                getattr(recipe, 'is_in_shopping_cart', False)
+            ),
+            'name': recipe.name,
+            'image': image_url(recipe.image, request),
+            'image_variants': images.variant_urls(recipe, request),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
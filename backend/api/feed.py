@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Follow, Recipe
+
+
+def cache_key(user_id):
+    return f'feed:{user_id}'
+
+
+def get_recipe_ids(user):
+    """Ids of the newest recipes of authors the user follows, newest first.
+
+    The list is cut at `FEED_CACHE_SIZE`, pages past it are read from
+    the database. Returns None when the fan-out cache is disabled.
+    """
+    if not settings.FEED_FANOUT:
+        return None
+    key = cache_key(user.id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Recipe.objects.filter(
+            author__in=user.following.values('author'),
+        ).order_by('-id').values_list(
+            'id',
+            flat=True,
+        )[:settings.FEED_CACHE_SIZE])
+        cache.set(key, ids, settings.FEED_CACHE_TIMEOUT)
+    return ids
+
+
+def get_page_ids(ids, before, count):
+    """Up to `count` ids older than `before` from the cached list.
+
+    Returns None when the cached list was cut short before the page
+    ends, so the page has to come from the database.
+    """
+    complete = len(ids) < settings.FEED_CACHE_SIZE
+    if before is not None:
+        ids = [id for id in ids if id < before]
+    if len(ids) < count and not complete:
+        return None
+    return ids[:count]
+
+
+def push(recipe):
+    """Put a new recipe on top of its author's followers' cached feeds.
+
+    Only feeds that are already cached are updated, the others are built
+    on their next read. Two recipes pushed at the same moment may race
+    for the same entry; the loser is back once the entry expires.
+    """
+    if not settings.FEED_FANOUT:
+        return
+
+    def fan_out():
+        keys = [
+            cache_key(user_id)
+            for user_id in Follow.objects.filter(
+                author=recipe.author_id,
+            ).values_list('user', flat=True)
+        ]
+        feeds = cache.get_many(keys)
+        cache.set_many(
+            {
+                key: [recipe.id, *ids][:settings.FEED_CACHE_SIZE]
+                for key, ids in feeds.items()
+            },
+            settings.FEED_CACHE_TIMEOUT,
+        )
+
+    transaction.on_commit(fan_out)
+
+
+def invalidate(*user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+def recipe_deleted(recipe):
+    """Drop the cached feeds of the author's followers on commit."""
+    if not settings.FEED_FANOUT:
+        return
+    user_ids = list(Follow.objects.filter(
+        author=recipe.author_id,
+    ).values_list('user', flat=True))
+    if user_ids:
+        transaction.on_commit(lambda: invalidate(*user_ids))
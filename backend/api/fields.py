@@ -0,0 +1,107 @@
+import base64
+import binascii
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+# A multiple of 4 so every chunk decodes on its own.
+CHUNK_SIZE = 256 * 1024
+
+
+def decoded_size(data, start):
+    """Size of the decoded base64 payload, without decoding it."""
+    padding = data[-2:].count('=')
+    return (len(data) - start) * 3 // 4 - padding
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Base64 image field that never holds the decoded image in memory.
+
+    The payload size is checked from the base64 length before anything
+    is decoded, the image is decoded chunk by chunk into a temporary
+    file, and its dimensions are read from the header of the first chunk
+    so oversized images are rejected before the rest is decoded.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Upload a valid base64 encoded image.',
+        'invalid_type': 'Upload a JPEG, PNG, GIF or WebP image.',
+        'too_large': 'The image may not be larger than {max_size} bytes.',
+        'too_wide': (
+            'The image may not be larger than {max_side}x{max_side} pixels.'
+        ),
+    }
+    ALLOWED_FORMATS = {
+        'JPEG': 'jpg',
+        'PNG': 'png',
+        'GIF': 'gif',
+        'WEBP': 'webp',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            self.fail('invalid_base64')
+        start = data.find(';base64,')
+        start = 0 if start == -1 else start + len(';base64,')
+        if decoded_size(data, start) > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.fail('too_large', max_size=settings.MAX_IMAGE_UPLOAD_SIZE)
+
+        upload = TemporaryUploadedFile(
+            name='image',
+            content_type=None,
+            size=0,
+            charset=None,
+        )
+        try:
+            upload.size = self.decode(data, start, upload.file)
+            upload.file.seek(0)
+            with Image.open(upload.file) as image:
+                image_format = image.format
+                self.check_dimensions(image)
+            if image_format not in self.ALLOWED_FORMATS:
+                self.fail('invalid_type')
+            upload.name = (
+                f'{uuid.uuid4()}.{self.ALLOWED_FORMATS[image_format]}'
+            )
+            upload.content_type = Image.MIME.get(image_format)
+            upload.file.seek(0)
+            return super().to_internal_value(upload)
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            upload.close()
+            self.fail('invalid_image')
+        except serializers.ValidationError:
+            upload.close()
+            raise
+
+    def decode(self, data, start, file):
+        size = 0
+        for position in range(start, len(data), CHUNK_SIZE):
+            try:
+                chunk = base64.b64decode(
+                    data[position:position + CHUNK_SIZE],
+                    validate=True,
+                )
+            except (binascii.Error, ValueError):
+                self.fail('invalid_base64')
+            if position == start:
+                self.check_header(chunk)
+            file.write(chunk)
+            size += len(chunk)
+        return size
+
+    def check_header(self, chunk):
+        try:
+            image = Image.open(BytesIO(chunk))
+        except (OSError, SyntaxError):
+            # The header does not fit into the first chunk, the whole
+            # file is checked once it is decoded.
+            return
+        self.check_dimensions(image)
+
+    def check_dimensions(self, image):
+        if max(image.size) > settings.MAX_IMAGE_SIDE:
+            self.fail('too_wide', max_side=settings.MAX_IMAGE_SIDE)
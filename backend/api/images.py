@@ -0,0 +1,136 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from api.cache import bump_version
+from recipes.models import Recipe
+
+logger = logging.getLogger('api.images')
+
+VARIANTS_DIR = 'recipes/images/variants'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+        return _executor
+
+
+def schedule(recipe_id):
+    """Build the image variants of a recipe once the transaction commits.
+
+    With IMAGE_WORKERS set to 0 the variants are built right after the
+    commit, in the calling thread.
+    """
+    def submit():
+        if not settings.IMAGE_WORKERS:
+            process(recipe_id)
+            return
+        future = get_executor().submit(run_in_worker, recipe_id)
+        _pending.add(future)
+        future.add_done_callback(_pending.discard)
+
+    transaction.on_commit(submit)
+
+
+def wait_for_pending():
+    """Block until every scheduled image has been processed."""
+    wait(list(_pending))
+
+
+def run_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        process(recipe_id)
+    except Exception:
+        logger.exception('Cannot process the image of recipe %s.', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def encode(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    image_format = settings.IMAGE_VARIANT_FORMAT
+    has_alpha = variant.mode in ('RGBA', 'LA', 'PA') or (
+        variant.mode == 'P' and 'transparency' in variant.info
+    )
+    mode = 'RGBA' if has_alpha and image_format == 'WEBP' else 'RGB'
+    if variant.mode != mode:
+        variant = variant.convert(mode)
+    buffer = BytesIO()
+    variant.save(
+        buffer,
+        image_format,
+        quality=settings.IMAGE_VARIANT_QUALITY,
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def process(recipe_id):
+    """Re-encode the recipe image into every configured size."""
+    recipe = Recipe.objects.filter(id=recipe_id).only(
+        'image', 'image_variants',
+    ).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    previous = recipe.image_variants
+    if previous.get('source') == source:
+        return
+
+    with default_storage.open(source) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+
+    stem = PurePosixPath(source).stem
+    extension = EXTENSIONS[settings.IMAGE_VARIANT_FORMAT]
+    variants = {'source': source}
+    for name, size in settings.IMAGE_VARIANTS.items():
+        variants[name] = default_storage.save(
+            f'{VARIANTS_DIR}/{stem}_{name}.{extension}',
+            encode(image, size),
+        )
+
+    # The image may have been replaced while this one was processed.
+    if Recipe.objects.filter(id=recipe_id, image=source).update(
+        image_variants=variants,
+    ):
+        stale, fresh = previous, variants
+        bump_version('recipes')
+    else:
+        stale, fresh = variants, previous
+    for name, path in stale.items():
+        if name != 'source' and path != fresh.get(name):
+            default_storage.delete(path)
+
+
+def variant_urls(recipe, request):
+    """Absolute URLs of the processed sizes, empty until they are ready."""
+    urls = {}
+    if recipe.image_variants.get('source') != recipe.image.name:
+        return urls
+    for name, path in recipe.image_variants.items():
+        if name == 'source':
+            continue
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,20 @@
+import json
+import logging
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the record's `extra` fields."""
+
+    reserved = frozenset(vars(logging.makeLogRecord({})))
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in self.reserved and key != 'message'
+        )
+        return json.dumps(entry, ensure_ascii=False, default=str)
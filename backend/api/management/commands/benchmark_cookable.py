@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from api.pantry import PantryIndex
+from recipes.models import Ingredient, Recipe
+from recipes.seed import DEFAULT_INGREDIENTS, seed_database, throwaway_database
+
+LIMIT = 50
+PANTRY_SIZES = (3, 10, 30)
+
+
+def database_search(ingredient_ids, limit):
+    """The join and GROUP BY a request would run without the index."""
+    return list(Recipe.objects.annotate(
+        matched=Count(
+            'recipeingredient',
+            filter=Q(recipeingredient__ingredient__in=ingredient_ids),
+        ),
+        total=Count('recipeingredient'),
+    ).filter(matched__gt=0).annotate(
+        coverage=Cast(F('matched'), FloatField()) / F('total'),
+    ).order_by('-coverage', '-matched', '-id').values_list(
+        'id',
+        flat=True,
+    )[:limit])
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway database and compares ranking recipes by '
+        'ingredient coverage in SQL with the in-process pantry index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--pantries', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.stdout.write('Seeding...')
+            seed_database(
+                users=options['users'],
+                recipes=options['recipes'],
+                ingredients_path=options['ingredients'],
+            )
+            index = PantryIndex()
+            start = time.perf_counter()
+            with index.lock:
+                index.refresh()
+            self.stdout.write(
+                f'Index of {len(index.recipes)} recipes built in '
+                f'{time.perf_counter() - start:.2f} s'
+            )
+            # Popular ingredients first, so pantries overlap many recipes.
+            ingredients = list(Ingredient.objects.annotate(
+                recipes_count=Count('recipeingredient'),
+            ).filter(recipes_count__gt=0).order_by(
+                '-recipes_count',
+            ).values_list('id', flat=True))
+            rng = random.Random(options['seed'])
+            for size in PANTRY_SIZES:
+                self.compare(index, ingredients, size, rng, options)
+
+    def compare(self, index, ingredients, size, rng, options):
+        sql_timings, index_timings = [], []
+        for _ in range(options['pantries']):
+            pantry = rng.sample(ingredients[:size * 10], size)
+            expected, sql_ms = timed(
+                lambda: database_search(pantry, LIMIT),
+                options['repeat'],
+            )
+            found, index_ms = timed(
+                lambda: [
+                    recipe_id
+                    for recipe_id, _, _ in index.search(pantry, LIMIT)
+                ],
+                options['repeat'],
+            )
+            if found != expected:
+                raise CommandError(
+                    f'The index and SQL ranked recipes differently for '
+                    f'ingredients {pantry}.'
+                )
+            sql_timings.append(sql_ms)
+            index_timings.append(index_ms)
+        sql_ms = statistics.median(sql_timings)
+        index_ms = statistics.median(index_timings)
+        self.stdout.write(
+            f'{size:>3} ingredients   sql {sql_ms:>9.2f} ms   '
+            f'index {index_ms:>8.2f} ms   x{sql_ms / index_ms:.1f}'
+        )
@@ -0,0 +1,122 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.views import RecipeViewSet
+from recipes.models import Recipe, User
+from recipes.seed import DEFAULT_INGREDIENTS, seed_database, throwaway_database
+
+PAGE_SIZE = 6
+
+FILTERS = {
+    'no filters': {},
+    'tags': {'tags': ['breakfast', 'lunch']},
+    'favorited': {'is_favorited': '1'},
+    'not favorited': {'is_favorited': '0'},
+    'in shopping cart': {'is_in_shopping_cart': '1'},
+    'tags and not in cart': {
+        'tags': ['dinner'],
+        'is_in_shopping_cart': '0',
+    },
+}
+
+
+def legacy_queryset(user, data):
+    """The join and DISTINCT based filtering the view used before."""
+    queryset = Recipe.objects.all()
+    if data.get('is_favorited'):
+        if data['is_favorited'] == '0':
+            queryset = queryset.exclude(favorited_by=user.id)
+        else:
+            queryset = queryset.filter(favorited_by__in=(user.id,))
+    if data.get('is_in_shopping_cart'):
+        if data['is_in_shopping_cart'] == '0':
+            queryset = queryset.exclude(in_shopping_cart=user.id)
+        else:
+            queryset = queryset.filter(in_shopping_cart__in=(user.id,))
+    if data.get('tags'):
+        queryset = queryset.filter(tags__slug__in=data['tags'])
+    return queryset.annotate(
+        is_favorited=Exists(user.favorite_set.filter(recipe=OuterRef('id'))),
+        is_in_shopping_cart=Exists(
+            user.shoppingcart_set.filter(recipe=OuterRef('id'))
+        ),
+    ).distinct()
+
+
+def current_queryset(user, data):
+    request = Request(APIRequestFactory().get('/api/recipes/', data))
+    request.user = user
+    view = RecipeViewSet(request=request, action='list', format_kwarg=None)
+    return view.get_queryset().prefetch_related(None)
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway database and compares query plans and latency '
+        'of the legacy join based recipe filters with the EXISTS based ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the query plan of every page query.',
+        )
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.stdout.write('Seeding...')
+            seed_database(
+                users=options['users'],
+                recipes=options['recipes'],
+                ingredients_path=options['ingredients'],
+                favorites_per_user=50,
+                cart_per_user=20,
+            )
+            user = User.objects.order_by('id').first()
+            for name, data in FILTERS.items():
+                self.compare(name, user, data, options)
+
+    def compare(self, name, user, data, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        pages = {}
+        for label, build in (
+            ('legacy', legacy_queryset),
+            ('exists', current_queryset),
+        ):
+            queryset = build(user, data)
+            page = queryset.order_by('-id')[:PAGE_SIZE]
+            pages[label], page_ms = timed(
+                lambda: [recipe.id for recipe in page.all()],
+                options['repeat'],
+            )
+            count, count_ms = timed(queryset.count, options['repeat'])
+            self.stdout.write(
+                f'  {label:<7} page {page_ms:>8.2f} ms   '
+                f'count {count_ms:>8.2f} ms   ({count} rows)'
+            )
+            if options['explain']:
+                for line in page.explain().splitlines():
+                    self.stdout.write(f'      {line}')
+        if pages['legacy'] != pages['exists']:
+            raise CommandError(
+                f'{name}: legacy and EXISTS filters returned different pages.'
+            )
@@ -0,0 +1,148 @@
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import (FastRecipeSerializer,
+                                  FastRecipeShortSerializer)
+from api.serializers import RecipeSerializer, RecipeShortSerializer
+from api.views import RecipeViewSet
+from recipes.models import User
+from recipes.seed import (DEFAULT_INGREDIENTS, ensure_seed_image,
+                          seed_database, throwaway_database)
+
+# The short serializer is also used without a request for recipes nested
+# in subscriptions, which renders relative image URLs.
+PAIRS = (
+    ('recipe', RecipeSerializer, FastRecipeSerializer, (True,)),
+    (
+        'recipe short',
+        RecipeShortSerializer,
+        FastRecipeShortSerializer,
+        (True, False),
+    ),
+)
+
+QUERIES = {
+    'all': {},
+    'favorited': {'is_favorited': '1'},
+    'in shopping cart': {'is_in_shopping_cart': '1'},
+    'tags': {'tags': ['lunch', 'dinner']},
+}
+
+
+# The list view leaves tags and ingredients to the dimension tables, the
+# DRF serializer needs them prefetched to be compared fairly.
+PREFETCH = {
+    RecipeSerializer: ('tags', 'recipeingredient_set__ingredient'),
+}
+
+
+def get_recipes(serializer_class, user, data, count):
+    """A fresh list of recipes the way the list view loads them."""
+    request = Request(APIRequestFactory().get('/api/recipes/', data))
+    request.user = user
+    view = RecipeViewSet(request=request, action='list', format_kwarg=None)
+    queryset = view.get_queryset().prefetch_related(
+        *PREFETCH.get(serializer_class, ()),
+    )
+    return request, list(queryset.order_by('-id')[:count])
+
+
+def render(serializer_class, instance, many, context):
+    return JSONRenderer().render(
+        serializer_class(instance, many=many, context=context).data
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks that the fast read-only recipe serializers render exactly '
+        'what the DRF serializers render and measures the speedup.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with throwaway_database(), tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                ensure_seed_image()
+                seed_database(
+                    users=options['users'],
+                    recipes=options['recipes'],
+                    ingredients_path=options['ingredients'],
+                    favorites_per_user=30,
+                    cart_per_user=10,
+                )
+                self.check_equivalence(options)
+                self.benchmark(options)
+
+    def check_equivalence(self, options):
+        checked = 0
+        for user in (AnonymousUser(), *User.objects.order_by('id')[:5]):
+            for name, data in QUERIES.items():
+                for label, slow, fast, contexts in PAIRS:
+                    for with_request in contexts:
+                        for many in (True, False):
+                            self.compare(
+                                f'{label}, {name}, as {user}',
+                                (slow, fast),
+                                (user, data, options['page_size']),
+                                with_request,
+                                many,
+                            )
+                            checked += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} renders are identical.'
+        ))
+
+    def compare(self, name, pair, query, with_request, many):
+        outputs = []
+        for serializer_class in pair:
+            request, recipes = get_recipes(serializer_class, *query)
+            if not recipes:
+                return
+            outputs.append(render(
+                serializer_class,
+                recipes if many else recipes[0],
+                many,
+                {'request': request} if with_request else {},
+            ))
+        if outputs[0] != outputs[1]:
+            raise CommandError(
+                f'{name}: outputs differ.\n{outputs[0][:500]}\n'
+                f'{outputs[1][:500]}'
+            )
+
+    def benchmark(self, options):
+        user = User.objects.order_by('id').first()
+        for label, slow, fast, _ in PAIRS:
+            timings = {}
+            for serializer_class in (slow, fast):
+                request, recipes = get_recipes(
+                    serializer_class, user, {}, options['page_size'],
+                )
+                context = {'request': request}
+                runs = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    serializer_class(recipes, many=True, context=context).data
+                    runs.append((time.perf_counter() - start) * 1000)
+                timings[serializer_class] = statistics.median(runs)
+            self.stdout.write(
+                f'{label:<14} {len(recipes)} recipes   '
+                f'drf {timings[slow]:>8.2f} ms   '
+                f'fast {timings[fast]:>8.2f} ms   '
+                f'x{timings[slow] / timings[fast]:.1f}'
+            )
@@ -0,0 +1,414 @@
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import images
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag, User)
+from recipes.seed import (DEFAULT_INGREDIENTS, SEED_PASSWORD,
+                          ensure_seed_image, seed_database, throwaway_database)
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+Route = namedtuple(
+    'Route',
+    'name method path queries ms as_user data prepare',
+    defaults=('user', None, None),
+)
+
+
+def recipe_data(context):
+    return {
+        'ingredients': [
+            {'id': ingredient, 'amount': 10}
+            for ingredient in context['ingredients']
+        ],
+        'tags': context['tags'],
+        'image': IMAGE,
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+    }
+
+
+def flag_absent(model, **lookup):
+    def prepare(context):
+        model.objects.filter(
+            **{field: context[key] for field, key in lookup.items()}
+        ).delete()
+    return prepare
+
+
+def flag_present(model, **lookup):
+    def prepare(context):
+        model.objects.get_or_create(
+            **{field: context[key] for field, key in lookup.items()}
+        )
+    return prepare
+
+
+def flags_present(model, field, key):
+    def prepare(context):
+        model.objects.bulk_create(
+            (
+                model(user=context['user'], **{field: id})
+                for id in context[key]
+            ),
+            ignore_conflicts=True,
+        )
+    return prepare
+
+
+def id_list(key):
+    return lambda context: {'ids': context[key]}
+
+
+def new_recipe(context):
+    context['new_recipe'] = Recipe.objects.create(
+        author=context['user'],
+        name='Удаляемый рецепт',
+        image=context['image'],
+        text='Описание',
+        cooking_time=10,
+    ).id
+
+
+def reset_own_recipe(context):
+    """Start every update from the same ingredients and tags.
+
+    Part of them overlap the payload, so the update keeps, changes, adds
+    and removes rows whatever the seed gave the recipe.
+    """
+    recipe = Recipe.objects.get(id=context['own_recipe'])
+    RecipeIngredient.objects.filter(recipe=recipe).delete()
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient_id=ingredient, amount=5)
+        for ingredient in context['old_ingredients']
+    )
+    recipe.tags.set(context['old_tags'])
+
+
+def new_username(context):
+    context['counter'] = context.get('counter', 0) + 1
+
+
+# Budgets are upper bounds for a seeded dataset; a serializer or queryset
+# change that multiplies queries per row will overshoot them.
+ROUTES = (
+    Route(
+        'auth-token-login', 'post', '/api/auth/token/login/', 5, 100,
+        as_user=None,
+        data=lambda context: {
+            'email': context['user'].email,
+            'password': SEED_PASSWORD,
+        },
+    ),
+    Route(
+        'auth-token-logout', 'post', '/api/auth/token/logout/', 3, 100,
+        as_user='other',
+    ),
+    Route('users-list', 'get', '/api/users/', 3, 100),
+    Route('users-detail', 'get', '/api/users/{author.id}/', 2, 100),
+    Route('users-me', 'get', '/api/users/me/', 2, 100),
+    Route(
+        'users-create', 'post', '/api/users/', 3, 100,
+        as_user=None,
+        data=lambda context: {
+            'email': f'new{context["counter"]}@example.com',
+            'username': f'new{context["counter"]}',
+            'first_name': 'Имя',
+            'last_name': 'Фамилия',
+            'password': 'Budget-password-1',
+        },
+        prepare=new_username,
+    ),
+    Route('tags-list', 'get', '/api/tags/', 3, 50),
+    Route('tags-detail', 'get', '/api/tags/{tags[0]}/', 3, 50),
+    Route('ingredients-list', 'get', '/api/ingredients/', 3, 300),
+    Route(
+        'ingredients-list-search', 'get', '/api/ingredients/?name=аб', 3, 50,
+    ),
+    Route(
+        'ingredients-detail', 'get',
+        '/api/ingredients/{ingredients[0]}/', 3, 50,
+    ),
+    # The first recipe page also loads the tag and ingredient tables.
+    Route('recipes-list', 'get', '/api/recipes/', 8, 200),
+    Route(
+        'recipes-list-anonymous', 'get', '/api/recipes/', 4, 200,
+        as_user=None,
+    ),
+    Route(
+        'recipes-list-cursor', 'get',
+        '/api/recipes/?pagination=cursor', 5, 200,
+    ),
+    Route(
+        'recipes-list-tags', 'get',
+        '/api/recipes/?tags=breakfast&tags=lunch', 6, 200,
+    ),
+    Route('recipes-feed', 'get', '/api/recipes/feed/', 6, 200),
+    Route(
+        'recipes-feed-deep', 'get', '/api/recipes/feed/?before=100', 5, 200,
+    ),
+    # The first search also builds the in-process index.
+    Route(
+        'recipes-search', 'get', '/api/recipes/search/?q=рецепт', 7, 500,
+    ),
+    # The first lookup also builds the in-process pantry index.
+    Route(
+        'recipes-cookable', 'get',
+        '/api/recipes/cookable/?ingredients={ingredients[0]}'
+        '&ingredients={ingredients[1]}', 7, 500,
+    ),
+    Route(
+        'recipes-list-favorited', 'get',
+        '/api/recipes/?is_favorited=1', 6, 200,
+    ),
+    Route(
+        'recipes-list-shopping-cart', 'get',
+        '/api/recipes/?is_in_shopping_cart=1', 6, 200,
+    ),
+    Route(
+        'recipes-list-author', 'get',
+        '/api/recipes/?author={author.id}', 6, 200,
+    ),
+    Route('recipes-detail', 'get', '/api/recipes/{recipe}/', 5, 100),
+    Route(
+        'recipes-create', 'post', '/api/recipes/', 23, 200,
+        data=recipe_data,
+    ),
+    Route(
+        'recipes-update', 'patch', '/api/recipes/{own_recipe}/', 28, 200,
+        data=recipe_data,
+        prepare=reset_own_recipe,
+    ),
+    Route(
+        'recipes-delete', 'delete', '/api/recipes/{new_recipe}/', 12, 200,
+        prepare=new_recipe,
+    ),
+    Route(
+        'favorite-add', 'post', '/api/recipes/{recipe}/favorite/', 5, 100,
+        prepare=flag_absent(Favorite, user='user', recipe_id='recipe'),
+    ),
+    Route(
+        'favorite-remove', 'delete', '/api/recipes/{recipe}/favorite/', 4, 100,
+        prepare=flag_present(Favorite, user='user', recipe_id='recipe'),
+    ),
+    Route(
+        'shopping-cart-add', 'post',
+        '/api/recipes/{recipe}/shopping_cart/', 5, 100,
+        prepare=flag_absent(ShoppingCart, user='user', recipe_id='recipe'),
+    ),
+    Route(
+        'shopping-cart-remove', 'delete',
+        '/api/recipes/{recipe}/shopping_cart/', 4, 100,
+        prepare=flag_present(ShoppingCart, user='user', recipe_id='recipe'),
+    ),
+    Route(
+        'favorite-bulk-add', 'post', '/api/recipes/favorite/', 6, 100,
+        data=id_list('recipes'),
+        prepare=flag_absent(Favorite, user='user', recipe_id__in='recipes'),
+    ),
+    Route(
+        'favorite-bulk-remove', 'delete', '/api/recipes/favorite/', 5, 100,
+        data=id_list('recipes'),
+        prepare=flags_present(Favorite, 'recipe_id', 'recipes'),
+    ),
+    Route(
+        'shopping-cart-bulk-add', 'post',
+        '/api/recipes/shopping_cart/', 6, 100,
+        data=id_list('recipes'),
+        prepare=flag_absent(
+            ShoppingCart, user='user', recipe_id__in='recipes',
+        ),
+    ),
+    Route(
+        'shopping-cart-bulk-remove', 'delete',
+        '/api/recipes/shopping_cart/', 5, 100,
+        data=id_list('recipes'),
+        prepare=flags_present(ShoppingCart, 'recipe_id', 'recipes'),
+    ),
+    Route(
+        'shopping-cart-download', 'get',
+        '/api/recipes/download_shopping_cart/', 2, 100,
+    ),
+    Route(
+        'shopping-cart-download-csv', 'get',
+        '/api/recipes/download_shopping_cart/?file_format=csv', 2, 100,
+    ),
+    Route(
+        'shopping-cart-download-json', 'get',
+        '/api/recipes/download_shopping_cart/?file_format=json', 2, 100,
+    ),
+    Route(
+        'subscribe', 'post', '/api/users/{author.id}/subscribe/', 7, 100,
+        prepare=flag_absent(Follow, user='user', author='author'),
+    ),
+    Route(
+        'unsubscribe', 'delete', '/api/users/{author.id}/subscribe/', 3, 100,
+        prepare=flag_present(Follow, user='user', author='author'),
+    ),
+    Route(
+        'subscribe-bulk', 'post', '/api/users/subscribe/', 5, 100,
+        data=id_list('authors'),
+        prepare=flag_absent(Follow, user='user', author_id__in='authors'),
+    ),
+    Route(
+        'unsubscribe-bulk', 'delete', '/api/users/subscribe/', 4, 100,
+        data=id_list('authors'),
+        prepare=flags_present(Follow, 'author_id', 'authors'),
+    ),
+    Route(
+        'subscriptions-list', 'get',
+        '/api/users/subscriptions/?recipes_limit=3', 4, 100,
+    ),
+    Route(
+        'subscriptions-list-cursor', 'get',
+        '/api/users/subscriptions/?recipes_limit=3&pagination=cursor', 3, 100,
+    ),
+    Route(
+        'subscriptions-list-unlimited', 'get',
+        '/api/users/subscriptions/', 4, 100,
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database and checks SQL query count '
+        'and wall time budgets of every API route.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--time-factor',
+            type=float,
+            default=1.0,
+            help='Multiplier for wall time budgets, 0 disables them.',
+        )
+
+    def handle(self, *args, **options):
+        with throwaway_database(), tempfile.TemporaryDirectory() as media:
+            with override_settings(
+                MEDIA_ROOT=media,
+                QUERY_INSPECTION_SAMPLE_RATE=0,
+                PASSWORD_HASHERS=[
+                    'django.contrib.auth.hashers.MD5PasswordHasher',
+                ],
+            ):
+                failures = self.check_budgets(options)
+                images.wait_for_pending()
+
+        if failures:
+            raise CommandError(
+                f'{failures} route(s) exceeded their budget.'
+            )
+        self.stdout.write(self.style.SUCCESS('All routes are within budget.'))
+
+    def get_context(self):
+        user = User.objects.order_by('id').first()
+        followed = user.following.values('author')
+        recipe = Recipe.objects.exclude(author=user).first()
+        tags = list(Tag.objects.values_list('id', flat=True)[:3])
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:8]
+        )
+        return {
+            'user': user,
+            'other': User.objects.exclude(id=user.id).first(),
+            'author': User.objects.exclude(id=user.id).exclude(
+                id__in=followed,
+            ).first(),
+            'recipe': recipe.id,
+            'recipes': list(Recipe.objects.exclude(
+                author=user,
+            ).values_list('id', flat=True)[:20]),
+            'authors': list(User.objects.exclude(
+                id=user.id,
+            ).values_list('id', flat=True)[:20]),
+            'image': recipe.image.name,
+            'own_recipe': Recipe.objects.filter(author=user).first().id,
+            'tags': tags[:2],
+            'old_tags': tags[1:],
+            'ingredients': ingredients[:5],
+            'old_ingredients': ingredients[3:],
+        }
+
+    def request(self, route, context):
+        if route.prepare:
+            route.prepare(context)
+        client = APIClient()
+        if route.as_user:
+            token, _ = Token.objects.get_or_create(
+                user=context[route.as_user],
+            )
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        data = route.data(context) if route.data else None
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, route.method)(
+                route.path.format(**context),
+                data,
+                format='json',
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{route.name} responded with {response.status_code}: '
+                f'{response.content[:200]!r}'
+            )
+        return len(queries), elapsed
+
+    def check_budgets(self, options):
+        ensure_seed_image()
+        summary = seed_database(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients_path=options['ingredients'],
+        )
+        self.stdout.write(
+            'Seeded ' + ', '.join(
+                f'{count} {name}' for name, count in summary.items()
+            )
+        )
+        context = self.get_context()
+        failures = 0
+        for route in ROUTES:
+            results = [
+                self.request(route, context)
+                for _ in range(options['repeat'])
+            ]
+            queries = max(count for count, _ in results)
+            elapsed = statistics.median(ms for _, ms in results)
+            ms_budget = route.ms * options['time_factor']
+            failed = queries > route.queries or (
+                ms_budget and elapsed > ms_budget
+            )
+            failures += bool(failed)
+            line = (
+                f'{route.name:<28} queries {queries:>3}/{route.queries:<3} '
+                f'time {elapsed:>7.1f}/{ms_budget:.0f} ms'
+            )
+            self.stdout.write(
+                self.style.ERROR(line) if failed else line
+            )
+        return failures
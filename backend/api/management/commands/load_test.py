@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, User
+
+Scenario = namedtuple('Scenario', 'name weight requests')
+
+SEARCH_PREFIXES = ('мо', 'сах', 'кар', 'м', 'яй', 'соль', 'пер')
+
+
+def recipes_list(context, rng):
+    page = rng.randint(1, 5)
+    yield 'GET', f'/api/recipes/?page={page}&limit=6'
+
+
+def recipes_list_tags(context, rng):
+    yield 'GET', '/api/recipes/?tags=breakfast&tags=dinner&limit=6'
+
+
+def recipes_detail(context, rng):
+    yield 'GET', f'/api/recipes/{rng.choice(context["recipes"])}/'
+
+
+def recipes_feed(context, rng):
+    yield 'GET', '/api/recipes/feed/?limit=6'
+
+
+def recipes_search(context, rng):
+    yield 'GET', f'/api/recipes/search/?q={quote(rng.choice(SEARCH_PREFIXES))}'
+
+
+def favorite_toggle(context, rng):
+    recipe = rng.choice(context['recipes'])
+    yield 'POST', f'/api/recipes/{recipe}/favorite/'
+    yield 'DELETE', f'/api/recipes/{recipe}/favorite/'
+
+
+def cart_toggle(context, rng):
+    recipe = rng.choice(context['recipes'])
+    yield 'POST', f'/api/recipes/{recipe}/shopping_cart/'
+    yield 'DELETE', f'/api/recipes/{recipe}/shopping_cart/'
+
+
+def cart_download(context, rng):
+    yield 'GET', '/api/recipes/download_shopping_cart/'
+
+
+def subscriptions(context, rng):
+    yield 'GET', '/api/users/subscriptions/?recipes_limit=3'
+
+
+def ingredient_search(context, rng):
+    yield 'GET', f'/api/ingredients/?name={quote(rng.choice(SEARCH_PREFIXES))}'
+
+
+SCENARIOS = (
+    Scenario('recipes-list', 30, recipes_list),
+    Scenario('recipes-list-tags', 10, recipes_list_tags),
+    Scenario('recipes-detail', 25, recipes_detail),
+    Scenario('feed', 10, recipes_feed),
+    Scenario('recipes-search', 5, recipes_search),
+    Scenario('favorite-toggle', 8, favorite_toggle),
+    Scenario('shopping-cart-toggle', 4, cart_toggle),
+    Scenario('shopping-cart-download', 5, cart_download),
+    Scenario('subscriptions', 8, subscriptions),
+    Scenario('ingredients-search', 10, ingredient_search),
+)
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    # Integer ceiling of percent * n / 100, free of float rounding.
+    rank = -(-percent * len(ordered) // 100)
+    return ordered[max(rank, 1) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays a weighted mix of API calls against a running server '
+        'and reports latency percentiles and throughput per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Seconds to run the traffic mix for.',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='How many existing users to send requests as.',
+        )
+        parser.add_argument(
+            '--anonymous',
+            type=float,
+            default=0.2,
+            help='Share of read requests sent without a token.',
+        )
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        context = self.get_context(options)
+        results = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def record(name, elapsed, failed):
+            with lock:
+                results[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+
+        def worker(number):
+            rng = random.Random(options['seed'] + number)
+            while time.perf_counter() < deadline:
+                self.run_scenario(context, rng, options, record)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for future in [
+                executor.submit(worker, number)
+                for number in range(options['concurrency'])
+            ]:
+                future.result()
+        self.report(results, errors, time.perf_counter() - start)
+
+    def get_context(self, options):
+        user_ids = list(User.objects.filter(
+            is_active=True,
+        ).order_by('id').values_list('id', flat=True)[:options['users']])
+        recipes = list(Recipe.objects.values_list('id', flat=True)[:10_000])
+        if not user_ids or not recipes or not Ingredient.objects.exists():
+            raise CommandError(
+                'The database has no users, recipes or ingredients, '
+                'run generate_data first.'
+            )
+        return {
+            'tokens': [
+                Token.objects.get_or_create(user_id=user_id)[0].key
+                for user_id in user_ids
+            ],
+            'recipes': recipes,
+        }
+
+    def run_scenario(self, context, rng, options, record):
+        scenario = rng.choices(
+            SCENARIOS,
+            weights=[scenario.weight for scenario in SCENARIOS],
+        )[0]
+        token = rng.choice(context['tokens'])
+        for method, path in scenario.requests(context, rng):
+            anonymous = (
+                method == 'GET'
+                and scenario.name.startswith(('recipes-', 'ingredients-'))
+                and rng.random() < options['anonymous']
+            )
+            request = Request(
+                options['base_url'] + path,
+                method=method,
+                headers={
+                    'Accept': 'application/json',
+                    **({} if anonymous else {
+                        'Authorization': f'Token {token}',
+                    }),
+                },
+            )
+            name = f'{method} {scenario.name}'
+            start = time.perf_counter()
+            try:
+                with urlopen(request, timeout=options['timeout']) as response:
+                    response.read()
+                failed = False
+            except HTTPError as error:
+                error.read()
+                # A toggle may race with itself across users and threads.
+                failed = error.code >= 500
+            except URLError as error:
+                raise CommandError(
+                    f'Cannot reach {options["base_url"]}: {error.reason}'
+                )
+            record(name, (time.perf_counter() - start) * 1000, failed)
+
+    def report(self, results, errors, elapsed):
+        self.stdout.write(
+            f'{"endpoint":<36}{"count":>7}{"errors":>8}{"rps":>8}'
+            f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+        )
+        total = 0
+        for name in sorted(results):
+            timings = sorted(results[name])
+            total += len(timings)
+            self.stdout.write(
+                f'{name:<36}{len(timings):>7}{errors[name]:>8}'
+                f'{len(timings) / elapsed:>8.1f}'
+                f'{percentile(timings, 50):>9.1f}'
+                f'{percentile(timings, 95):>9.1f}'
+                f'{percentile(timings, 99):>9.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} requests in {elapsed:.1f} s, '
+            f'{total / elapsed:.1f} requests per second.'
+        ))
+        if any(errors.values()):
+            self.stdout.write(self.style.WARNING(
+                'Server errors: ' + ', '.join(
+                    f'{name}: {count}' for name, count in errors.items()
+                )
+            ))
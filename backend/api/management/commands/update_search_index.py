@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.search import get_recipe_search_engine
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the full-text search vectors of all recipes, for '
+        'recipes loaded or changed without going through the models.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        engine = get_recipe_search_engine()
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        size = options['batch_size']
+        for start in range(0, len(ids), size):
+            batch = ids[start:start + size]
+            engine.update(Recipe.objects.filter(
+                id__range=(batch[0], batch[-1]),
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index updated for {len(ids)} recipes.'
+        ))
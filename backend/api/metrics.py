@@ -0,0 +1,100 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+HISTOGRAMS = {
+    'request_duration_ms': DURATION_BUCKETS,
+    'python_duration_ms': DURATION_BUCKETS,
+    'sql_duration_ms': DURATION_BUCKETS,
+    'sql_queries': QUERY_BUCKETS,
+    'response_size_bytes': SIZE_BUCKETS,
+}
+
+
+class Histogram:
+    """Fixed bucket histogram, cumulative like Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'count': cumulative, 'sum': self.sum, 'buckets': buckets}
+
+
+class Metrics:
+    """Process-local counters and per-route histograms.
+
+    Exposed as JSON and in the Prometheus text format through the
+    metrics endpoints; every worker process keeps its own numbers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.histograms = {}
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, route, values):
+        with self.lock:
+            for name, value in values.items():
+                key = (name, route)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(HISTOGRAMS[name])
+                self.histograms[key].observe(value)
+
+    def snapshot(self):
+        with self.lock:
+            histograms = {}
+            for (name, route), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, {})[route] = histogram.snapshot()
+            return {
+                'pid': os.getpid(),
+                'counters': dict(self.counters),
+                'histograms': histograms,
+            }
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE foodgram_{name}_total counter')
+            lines.append(f'foodgram_{name}_total {value}')
+        for name, routes in snapshot['histograms'].items():
+            lines.append(f'# TYPE foodgram_{name} histogram')
+            for route, histogram in routes.items():
+                for bound, count in histogram['buckets'].items():
+                    lines.append(
+                        f'foodgram_{name}_bucket'
+                        f'{{route="{route}",le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'foodgram_{name}_sum{{route="{route}"}} '
+                    f'{histogram["sum"]}'
+                )
+                lines.append(
+                    f'foodgram_{name}_count{{route="{route}"}} '
+                    f'{histogram["count"]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.fields import Field
+
+from api.metrics import metrics
+
+logger = logging.getLogger('api.queries')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LITERALS = re.compile(r"'[^']*'|\b\d+\b")
+APPLICATION = str(settings.BASE_DIR)
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def fingerprint(sql):
+    """Hash of the statement with literals and IN lists collapsed."""
+    normalized = LITERALS.sub('?', IN_LIST.sub('IN (...)', sql))
+    return hashlib.sha1(' '.join(normalized.split()).encode()).hexdigest()[:12]
+
+
+def get_origin():
+    """Project frame and serializer field that issued the query."""
+    frame = sys._getframe(2)
+    origin = field = None
+    while frame is not None and origin is None:
+        owner = frame.f_locals.get('self')
+        if field is None and isinstance(owner, Field):
+            field = type(owner).__name__
+            if owner.field_name:
+                field = f'{type(owner.parent).__name__}.{owner.field_name}'
+        filename = frame.f_code.co_filename
+        if filename.startswith(APPLICATION) and filename != __file__:
+            origin = (
+                f'{filename[len(APPLICATION) + 1:]}:{frame.f_lineno} '
+                f'in {frame.f_code.co_name}'
+            )
+        frame = frame.f_back
+    return origin, field
+
+
+def get_view(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'cls', None) or getattr(
+        match.func, 'view_class', match.func,
+    )
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+class QueryInspector:
+    """Execute wrapper flagging slow and repeated queries of a request.
+
+    Slow queries are logged as soon as they finish, duplicates once the
+    response is ready. Both carry the route, the view and the project
+    frame the query was issued from, e.g. a serializer method.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.counts = Counter()
+        self.durations = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            key = fingerprint(sql)
+            self.counts[key] += 1
+            self.durations[key] += duration
+            if key not in self.samples:
+                self.samples[key] = (sql, get_origin())
+            if duration >= settings.SLOW_QUERY_MS:
+                metrics.increment('slow_queries')
+                self.log('slow_query', key, duration_ms=round(duration, 2))
+
+    def log(self, event, key, **fields):
+        sql, (origin, field) = self.samples[key]
+        logger.warning(event, extra={
+            'route': get_route(self.request),
+            'view': get_view(self.request),
+            'path': self.request.path,
+            'fingerprint': key,
+            'origin': origin,
+            'serializer_field': field,
+            'sql': sql,
+            **fields,
+        })
+
+    def report_duplicates(self):
+        for key, count in self.counts.items():
+            if count >= settings.DUPLICATE_QUERY_THRESHOLD:
+                metrics.increment('duplicate_queries')
+                self.log(
+                    'duplicate_query',
+                    key,
+                    count=count,
+                    duration_ms=round(self.durations[key], 2),
+                )
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.url_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """Record wall time, SQL and response size of every request.
+
+    Numbers are aggregated per resolved route name and reported back in
+    the `Server-Timing` header. Python time is the wall time not spent
+    waiting for the database, which is mostly serialization and
+    rendering. Streaming bodies are produced after the middleware
+    returns, so only the work done before the first chunk is counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        inspector = None
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            if random.random() < settings.QUERY_INSPECTION_SAMPLE_RATE:
+                inspector = QueryInspector(request)
+                with connection.execute_wrapper(inspector):
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        total = (time.perf_counter() - start) * 1000
+        sql = timer.duration * 1000
+        if inspector is not None:
+            inspector.report_duplicates()
+
+        values = {
+            'request_duration_ms': total,
+            'python_duration_ms': total - sql,
+            'sql_duration_ms': sql,
+            'sql_queries': timer.count,
+        }
+        if not response.streaming:
+            values['response_size_bytes'] = len(response.content)
+        metrics.observe(get_route(request), values)
+
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={sql:.1f};desc="{timer.count} queries"',
+            f'python;dur={total - sql:.1f}',
+            f'total;dur={total:.1f}',
+        ))
+        return response
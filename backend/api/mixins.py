@@ -1,3 +1,10 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from rest_framework import mixins, viewsets
 
 
@@ -6,3 +13,97 @@ class OnlyListViewset(
     viewsets.GenericViewSet,
 ):
     pass
+
+
+class SearchLimitMixin:
+    """Number of results asked for with `limit`, capped at `search_limit`."""
+
+    search_limit = None
+
+    def get_search_limit(self):
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return self.search_limit
+        return max(1, min(limit, self.search_limit))
+
+
+class ConditionalMixin:
+    """ETag support for list and retrieve actions.
+
+    By default the validators are built from the row count and the
+    latest `updated_at` of the queryset, so a 304 costs a single
+    aggregate query and skips serialization entirely. Only retrieve
+    responses carry Last-Modified: removing a row from a list leaves the
+    latest `updated_at` in place, so If-Modified-Since would answer 304
+    to a list that lost an item.
+    """
+
+    private = False
+
+    def get_validators(self, queryset):
+        """Parts of the ETag and the Last-Modified timestamp."""
+        state = queryset.order_by().aggregate(
+            count=Count('pk'),
+            last_modified=Max('updated_at'),
+        )
+        # The ETag takes the full precision timestamp, so an edit within
+        # the second of the previous fetch still changes it; only the
+        # Last-Modified header is limited to seconds.
+        updated_at = state['last_modified']
+        last_modified = None
+        if updated_at is not None:
+            if self.action == 'retrieve':
+                last_modified = int(updated_at.timestamp())
+            updated_at = updated_at.isoformat()
+        return (
+            (self.request.get_full_path(), state['count'], updated_at),
+            last_modified,
+        )
+
+    def conditional_response(self, queryset, get_response):
+        etag_parts, last_modified = self.get_validators(queryset)
+        digest = hashlib.md5(
+            ':'.join(str(part) for part in etag_parts).encode()
+        ).hexdigest()
+        etag = f'W/"{digest}"'
+
+        response = get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is None:
+            response = get_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            if self.private:
+                patch_cache_control(response, private=True)
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.filter_queryset(self.get_queryset()),
+            lambda: super(ConditionalMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_response():
+            return super(ConditionalMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            return get_response()
+        return self.conditional_response(queryset, get_response)
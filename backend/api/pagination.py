@@ -1,5 +1,91 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPagePagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class PageOrCursorPagination(BasePagination):
+    """Page number pagination, or keyset pagination over `-id` on demand.
+
+    `?pagination=cursor` (or a `cursor` taken from a `next` link) skips
+    the COUNT query and the OFFSET scan, so deep pages cost the same as
+    the first one.
+    """
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or 'cursor' in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.paginator = LimitCursorPagination()
+        else:
+            self.paginator = LimitPagePagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination over `-id` with a plain `before` id.
+
+    The position is readable, unlike the opaque cursor, so a page can
+    also be cut from a cached list of ids before the queryset is read.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    position_query_param = 'before'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return size if size > 0 else self.page_size
+
+    def get_position(self, request):
+        try:
+            return int(request.query_params[self.position_query_param])
+        except (KeyError, ValueError):
+            return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        before = self.get_position(request)
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        # One row more than the page tells whether there is a next page.
+        page = list(queryset.order_by('-id')[:size + 1])
+        self.fetched = len(page)
+        self.next_position = page[size - 1].id if len(page) > size else None
+        return page[:size]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.position_query_param,
+            self.next_position,
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,111 @@
+import heapq
+from collections import Counter
+from itertools import chain
+
+from django.db import transaction
+
+from api.search import IncrementalRecipeIndex
+from recipes.models import Recipe, RecipeIngredient
+
+
+class PantryIndex(IncrementalRecipeIndex):
+    """Sorted ingredient ids of every recipe and recipes by ingredient.
+
+    Ranks recipes by the share of their ingredients found among the ones
+    on hand. Only recipes sharing at least one ingredient with the pantry
+    are looked at, and they are counted from the ingredient postings
+    without touching the database.
+    """
+
+    def clear(self):
+        self.recipes = {}
+        self.postings = {}
+
+    def read(self, since):
+        rows = RecipeIngredient.objects.order_by()
+        recipes = Recipe.objects.all()
+        if since is not None:
+            rows = rows.filter(recipe__updated_at__gte=since)
+            recipes = recipes.filter(updated_at__gte=since)
+        documents = {
+            recipe_id: []
+            for recipe_id in recipes.values_list('id', flat=True).iterator()
+        }
+        for recipe_id, ingredient_id in rows.values_list(
+            'recipe',
+            'ingredient',
+        ).iterator():
+            if recipe_id in documents:
+                documents[recipe_id].append(ingredient_id)
+        return documents
+
+    def add(self, recipe_id, ingredient_ids):
+        self.remove(recipe_id)
+        ingredient_ids = tuple(sorted(set(ingredient_ids)))
+        self.recipes[recipe_id] = ingredient_ids
+        for ingredient_id in ingredient_ids:
+            self.postings.setdefault(ingredient_id, set()).add(recipe_id)
+
+    def remove(self, recipe_id):
+        for ingredient_id in self.recipes.pop(recipe_id, ()):
+            self.postings[ingredient_id].discard(recipe_id)
+
+    def indexed_ids(self):
+        return self.recipes.keys()
+
+    def recipe_changed(self, recipe_id, ingredient_ids):
+        """Index a recipe saved by this process once it is committed.
+
+        Other processes pick it up on their next refresh.
+        """
+        def update():
+            with self.lock:
+                if self.versions is not None:
+                    self.add(recipe_id, ingredient_ids)
+
+        transaction.on_commit(update)
+
+    def search(self, ingredient_ids, limit, min_coverage=0):
+        """Best covered recipes as (id, coverage, missing ingredient ids).
+
+        Ties go to recipes with more matching ingredients, then to newer
+        ones.
+        """
+        have = set(ingredient_ids)
+        with self.lock:
+            self.refresh()
+            matched = Counter(chain.from_iterable(
+                self.postings.get(ingredient_id, ())
+                for ingredient_id in have
+            ))
+            coverage = {
+                recipe_id: count / len(self.recipes[recipe_id])
+                for recipe_id, count in matched.items()
+            }
+            best = heapq.nlargest(
+                limit,
+                (
+                    recipe_id for recipe_id, share in coverage.items()
+                    if share >= min_coverage
+                ),
+                key=lambda recipe_id: (
+                    coverage[recipe_id],
+                    matched[recipe_id],
+                    recipe_id,
+                ),
+            )
+            return [
+                (
+                    recipe_id,
+                    coverage[recipe_id],
+                    [
+                        ingredient_id
+                        for ingredient_id in self.recipes[recipe_id]
+                        if ingredient_id not in have
+                    ],
+                )
+                for recipe_id in best
+            ]
+
+
+index = PantryIndex()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from api import exceptions
+
+
+class LimitedJSONParser(JSONParser):
+    """JSON parser refusing bodies over MAX_RECIPE_BODY_SIZE.
+
+    DRF parses the request stream directly, so Django's own
+    DATA_UPLOAD_MAX_MEMORY_SIZE, which only guards `request.body` and
+    form fields, never applies. The declared length is checked before a
+    single byte is read.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        limit = settings.MAX_RECIPE_BODY_SIZE
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if limit is not None and length > limit:
+            raise exceptions.PayloadTooLargeException()
+        return super().parse(stream, media_type, parser_context)
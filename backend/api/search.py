@@ -0,0 +1,231 @@
+import abc
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.cache import get_version
+from recipes.models import Recipe, RecipeIngredient
+
+WORD = re.compile(r'\w+')
+# Words shorter than this only match themselves, longer ones also match
+# the words they begin, which stands in for stemming.
+PREFIX_MIN_LENGTH = 3
+# The default PostgreSQL weights of the A, B and C vector labels.
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+# Transactions may commit rows older than the last refresh, so each
+# refresh re-reads a little of what the previous one has seen.
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def tokenize(text):
+    return WORD.findall(text.casefold().replace('ё', 'е'))
+
+
+def search_vector():
+    """Weighted vector of a recipe's name, ingredient names and text."""
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredients = RecipeIngredient.objects.filter(
+        recipe=OuterRef('id'),
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' '),
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredients), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+class DatabaseRecipeSearch:
+    """Ranked full-text search over the precomputed `search_vector`.
+
+    Needs PostgreSQL, where the column has a GIN index.
+    """
+
+    def search(self, text, limit):
+        query = SearchQuery(
+            text,
+            config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        return list(Recipe.objects.filter(
+            search_vector=query,
+        ).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-id').values_list('id', flat=True)[:limit])
+
+    def update(self, recipes):
+        recipes.update(search_vector=search_vector())
+
+
+class IncrementalRecipeIndex(abc.ABC):
+    """Base of in-process indexes kept in step with the recipes table.
+
+    The first use reads every recipe, later ones re-read only recipes
+    whose `updated_at` moved since the previous refresh and drop deleted
+    ones. Changed ingredients rebuild the whole index, as deleting one
+    does not touch the recipes it was removed from.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = None
+        self.synced_at = None
+        self.clear()
+
+    @abc.abstractmethod
+    def clear(self):
+        """Empty the index."""
+
+    @abc.abstractmethod
+    def read(self, since):
+        """Documents of recipes changed since `since`, or all, by id."""
+
+    @abc.abstractmethod
+    def add(self, recipe_id, document):
+        """Index a recipe, replacing what was indexed for it before."""
+
+    @abc.abstractmethod
+    def remove(self, recipe_id):
+        """Drop a recipe from the index."""
+
+    @abc.abstractmethod
+    def indexed_ids(self):
+        """Ids of the indexed recipes, as a set-like view."""
+
+    def refresh(self):
+        """Catch up with the database, the caller holds the lock."""
+        versions = (get_version('ingredients'), get_version('recipes'))
+        if versions == self.versions:
+            return
+        started = timezone.now()
+        if self.versions is None or versions[0] != self.versions[0]:
+            self.clear()
+            since = None
+        else:
+            since = self.synced_at - SYNC_OVERLAP
+            alive = set(Recipe.objects.values_list('id', flat=True))
+            for recipe_id in self.indexed_ids() - alive:
+                self.remove(recipe_id)
+        for recipe_id, document in self.read(since).items():
+            self.add(recipe_id, document)
+        self.versions = versions
+        self.synced_at = started
+
+
+class RecipeIndex(IncrementalRecipeIndex):
+    """In-process inverted index of recipe names, ingredients and texts.
+
+    A recipe has to match every word of the query and scores, per word,
+    the PostgreSQL label weight of the best field the word is found in,
+    so a name match outranks a word repeated all over the text; ties go
+    to newer recipes.
+    """
+
+    def clear(self):
+        self.postings = {}
+        self.documents = {}
+        self.words = None
+
+    def read(self, since):
+        recipes = Recipe.objects.only('id', 'name', 'text')
+        ingredients = RecipeIngredient.objects.all()
+        if since is not None:
+            recipes = recipes.filter(updated_at__gte=since)
+            ingredients = ingredients.filter(recipe__updated_at__gte=since)
+        documents = {
+            recipe.id: [('name', recipe.name), ('text', recipe.text)]
+            for recipe in recipes.iterator()
+        }
+        for recipe_id, name in ingredients.values_list(
+            'recipe',
+            'ingredient__name',
+        ).iterator():
+            if recipe_id in documents:
+                documents[recipe_id].append(('ingredients', name))
+        return documents
+
+    def add(self, recipe_id, fields):
+        self.remove(recipe_id)
+        scores = {}
+        for field, text in fields:
+            for word in tokenize(text):
+                scores[word] = max(scores.get(word, 0), WEIGHTS[field])
+        for word, score in scores.items():
+            if word not in self.postings:
+                self.postings[word] = {}
+                self.words = None
+            self.postings[word][recipe_id] = score
+        self.documents[recipe_id] = tuple(scores)
+
+    def remove(self, recipe_id):
+        for word in self.documents.pop(recipe_id, ()):
+            del self.postings[word][recipe_id]
+
+    def indexed_ids(self):
+        return self.documents.keys()
+
+    def matching_words(self, word):
+        if len(word) < PREFIX_MIN_LENGTH:
+            if word in self.postings:
+                yield word
+            return
+        if self.words is None:
+            self.words = sorted(self.postings)
+        position = bisect_left(self.words, word)
+        while (
+            position < len(self.words)
+            and self.words[position].startswith(word)
+        ):
+            yield self.words[position]
+            position += 1
+
+    def score(self, word):
+        scores = {}
+        for match in self.matching_words(word):
+            for recipe_id, score in self.postings[match].items():
+                scores[recipe_id] = max(scores.get(recipe_id, 0), score)
+        return scores
+
+    def search(self, text, limit):
+        words = list(dict.fromkeys(tokenize(text)))
+        if not words:
+            return []
+        with self.lock:
+            self.refresh()
+            scores = self.score(words[0])
+            for word in words[1:]:
+                matches = self.score(word)
+                scores = {
+                    recipe_id: score + matches[recipe_id]
+                    for recipe_id, score in scores.items()
+                    if recipe_id in matches
+                }
+        return heapq.nlargest(
+            limit,
+            scores,
+            key=lambda recipe_id: (scores[recipe_id], recipe_id),
+        )
+
+    def update(self, recipes):
+        """Nothing to do, changes are picked up by the next search."""
+
+
+_engine = None
+
+
+def get_recipe_search_engine():
+    global _engine
+    if _engine is None:
+        _engine = import_string(settings.RECIPE_SEARCH_ENGINE)()
+    return _engine
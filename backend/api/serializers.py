@@ -1,11 +1,23 @@
 from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api import feed, images, pantry, shopping_cart
+from api.fast_serializers import FastRecipeShortSerializer
+from api.fields import StreamingBase64ImageField
+from recipes.counters import change_recipes_count
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, User
 
 
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params.get('recipes_limit', ''))
+    except ValueError:
+        return None
+    return limit if limit >= 0 else None
+
+
 class FoodgramUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -24,8 +36,11 @@ class FoodgramUserSerializer(UserSerializer):
     def get_is_subscribed(self, user):
         if hasattr(user, 'is_subscribed'):
             return user.is_subscribed
+        request_user = self.context['request'].user
+        if not request_user.is_authenticated:
+            return False
         return user.followers.filter(
-            user=self.context['request'].user,
+            user=request_user,
         ).exists()
 
 
@@ -42,14 +57,14 @@ class FoodgramUserWithRecipesSerializer(FoodgramUserSerializer):
         read_only_fields = fields
 
     def get_recipes(self, user):
-        recipes = user.recipes.all()
-        limit = self.context['request'].query_params.get('recipes_limit')
-        if limit:
-            try:
-                recipes = recipes[:int(limit)]
-            except ValueError:
-                pass
-        return RecipeShortSerializer(recipes, many=True).data
+        if hasattr(user, 'prefetched_recipes'):
+            recipes = user.prefetched_recipes
+        else:
+            recipes = user.recipes.all()
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
+        return FastRecipeShortSerializer(recipes, many=True).data
 
     def get_recipes_count(self, user):
         if hasattr(user, 'recipes_count'):
@@ -128,6 +143,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.BooleanField(
         default=False,
     )
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -140,14 +156,18 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
 
+    def get_image_variants(self, recipe):
+        return images.variant_urls(recipe, self.context.get('request'))
+
 
 class RecipePostSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
     cooking_time = serializers.IntegerField(
         max_value=settings.MAX_COOKING_TIME,
         min_value=settings.MIN_COOKING_TIME,
@@ -164,6 +184,14 @@ class RecipePostSerializer(serializers.ModelSerializer):
             'cooking_time',
         )
 
+    def validate_ingredients(self, ingredients):
+        ids = [data['ingredient'].id for data in ingredients]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ingredients must not repeat.'
+            )
+        return ingredients
+
     def bulk_create(self, recipe, ingredients):
         ingredient_objects = []
         for data in ingredients:
@@ -176,26 +204,91 @@ class RecipePostSerializer(serializers.ModelSerializer):
             )
         RecipeIngredient.objects.bulk_create(ingredient_objects)
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # The decoded image is moved into storage on save, closing the
+            # temporary upload keeps it from trying to delete it later.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         instance = super().create(validated_data)
 
         self.bulk_create(instance, ingredients)
+        change_recipes_count(instance.author_id, 1)
+        feed.push(instance)
+        pantry.index.recipe_changed(
+            instance.id,
+            [data['ingredient'].id for data in ingredients],
+        )
 
         return instance
 
+    def update_ingredients(self, recipe, ingredients):
+        """Diff the recipe's ingredient rows against the new list.
+
+        Rows of ingredients that stay keep their ids and are only updated
+        when the amount changed. Returns whether anything was written.
+        """
+        amounts = {
+            data['ingredient'].id: data['amount'] for data in ingredients
+        }
+        kept = {}
+        removed = []
+        for row in RecipeIngredient.objects.filter(recipe=recipe).only(
+            'id', 'ingredient', 'amount',
+        ):
+            if row.ingredient_id in amounts and row.ingredient_id not in kept:
+                kept[row.ingredient_id] = row
+            else:
+                removed.append(row.id)
+        changed = []
+        for ingredient_id, row in kept.items():
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        added = [
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in kept
+        ]
+
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        return bool(removed or changed or added)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
+        ingredients = validated_data.pop('ingredients', None)
+        # Tags go through the related manager's set(), which already only
+        # adds and removes the difference.
         instance = super().update(instance, validated_data)
 
-        if ingredients:
-            instance.ingredients.clear()
-            self.bulk_create(instance, ingredients)
+        if ingredients and self.update_ingredients(instance, ingredients):
+            shopping_cart.invalidate_recipe(instance.id)
+            pantry.index.recipe_changed(
+                instance.id,
+                [data['ingredient'].id for data in ingredients],
+            )
 
         return instance
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -203,11 +296,30 @@ class RecipeShortSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
 
+    def get_image_variants(self, recipe):
+        return images.variant_urls(recipe, self.context.get('request'))
+
+
+class IdListSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_BULK_IDS,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+        )
@@ -0,0 +1,87 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingCart
+
+HEADER = ('name', 'measurement_unit', 'amount')
+
+
+def get_shopping_cart(user):
+    return RecipeIngredient.objects.filter(
+        recipe__in_shopping_cart=user.id,
+    ).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+    ).annotate(
+        amount=Sum('amount'),
+    ).order_by(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+    )
+
+
+def cache_key(user_id):
+    return f'shopping_cart:{user_id}'
+
+
+def get_cached_shopping_cart(user):
+    """Aggregated cart rows, cached per user until the cart changes."""
+    if not user.is_authenticated:
+        return ()
+    key = cache_key(user.id)
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(get_shopping_cart(user))
+        cache.set(key, rows, settings.SHOPPING_CART_CACHE_TIMEOUT)
+    return rows
+
+
+def invalidate(*user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+def invalidate_recipe(recipe_id):
+    """Drop cached carts of every user who has the recipe in the cart."""
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=recipe_id,
+    ).values_list('user', flat=True))
+    if user_ids:
+        transaction.on_commit(lambda: invalidate(*user_ids))
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_text(rows):
+    for name, measurement_unit, amount in rows:
+        yield f'{name}, {amount} {measurement_unit}\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    separator = '['
+    for row in rows:
+        item = json.dumps(dict(zip(HEADER, row)), ensure_ascii=False)
+        yield separator + item
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_text),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+}
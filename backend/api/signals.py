@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import images
+from api.cache import bump_version
+from api.search import get_recipe_search_engine
+from recipes.models import Ingredient, Recipe, Tag, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version('ingredients'))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: get_recipe_search_engine().update(
+            Recipe.objects.filter(ingredients=instance.id),
+        ))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version('tags'))
+
+
+@receiver((post_save, post_delete), sender=User)
+def users_changed(update_fields=None, **kwargs):
+    # Logging in only stamps `last_login`, which no response shows.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: bump_version('users'))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_text_changed(instance, **kwargs):
+    # Ingredients are written after the recipe itself, so the vector is
+    # computed once the whole transaction is in.
+    transaction.on_commit(lambda: get_recipe_search_engine().update(
+        Recipe.objects.filter(id=instance.id),
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(instance, **kwargs):
+    if (
+        instance.image
+        and instance.image_variants.get('source') != instance.image.name
+    ):
+        images.schedule(instance.id)
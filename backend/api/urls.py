@@ -1,8 +1,10 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from api.views import (FavoriteView, FollowGetView, FollowView,
-                       FoodgramUserViewSet, IngredientViewSet, RecipeViewSet,
+from api.views import (BulkFavoriteView, BulkFollowView, BulkShoppingCartView,
+                       FavoriteView, FollowGetView, FollowView,
+                       FoodgramUserViewSet, IngredientViewSet, MetricsView,
+                       PrometheusMetricsView, RecipeViewSet,
                        ShoppingCartDownload, ShoppingCartView, TagViewSet)
 
 router = routers.DefaultRouter()
@@ -14,10 +16,46 @@ router.register('ingredients', IngredientViewSet)
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('recipes/<int:id>/favorite/', FavoriteView.as_view()),
-    path('recipes/<int:id>/shopping_cart/', ShoppingCartView.as_view()),
-    path('recipes/download_shopping_cart/', ShoppingCartDownload.as_view()),
-    path('recipes/download_shopping_cart/', ShoppingCartDownload.as_view()),
-    path('users/<int:id>/subscribe/', FollowView.as_view()),
+    path(
+        'recipes/favorite/',
+        BulkFavoriteView.as_view(),
+        name='favorite-bulk',
+    ),
+    path(
+        'recipes/shopping_cart/',
+        BulkShoppingCartView.as_view(),
+        name='shopping-cart-bulk',
+    ),
+    path(
+        'recipes/<int:id>/favorite/',
+        FavoriteView.as_view(),
+        name='favorite',
+    ),
+    path(
+        'recipes/<int:id>/shopping_cart/',
+        ShoppingCartView.as_view(),
+        name='shopping-cart',
+    ),
+    path(
+        'recipes/download_shopping_cart/',
+        ShoppingCartDownload.as_view(),
+        name='download-shopping-cart',
+    ),
+    path(
+        'users/subscribe/',
+        BulkFollowView.as_view(),
+        name='subscribe-bulk',
+    ),
+    path(
+        'users/<int:id>/subscribe/',
+        FollowView.as_view(),
+        name='subscribe',
+    ),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path(
+        'metrics/prometheus/',
+        PrometheusMetricsView.as_view(),
+        name='metrics-prometheus',
+    ),
     path('', include(router.urls)),
 ]
@@ -1,22 +1,39 @@
 from http import HTTPStatus
 
-from django.db.models import Count, Exists, OuterRef, Sum
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api import exceptions
-from api.mixins import OnlyListViewset
+from api import exceptions, feed, pantry, shopping_cart
+from api.autocomplete import get_search_engine
+from api.cache import bump_version, get_version, recipe_list_cache_key
+from api.fast_serializers import (FastRecipeSerializer,
+                                  FastRecipeShortSerializer)
+from api.metrics import metrics
+from api.mixins import ConditionalMixin, OnlyListViewset, SearchLimitMixin
+from api.pagination import KeysetPagination, PageOrCursorPagination
+from api.parsers import LimitedJSONParser
+from api.search import get_recipe_search_engine
 from api.serializers import (FoodgramUserWithRecipesSerializer,
-                             IngredientSerializer, RecipePostSerializer,
-                             RecipeSerializer, RecipeShortSerializer,
-                             TagSerializer)
-from recipes.models import (Favorite, Follow, Ingredient, Recipe, ShoppingCart,
-                            Tag, User)
+                             IdListSerializer, IngredientSerializer,
+                             RecipePostSerializer, RecipeSerializer,
+                             TagSerializer, get_recipes_limit)
+from recipes.counters import change_recipe_counter, change_recipes_count
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag, User)
 
 
 class FoodgramUserViewSet(UserViewSet):
@@ -32,42 +49,80 @@ class FoodgramUserViewSet(UserViewSet):
         return queryset
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalMixin, ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalMixin, SearchLimitMixin, ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    pagination_class = PageOrCursorPagination
+    parser_classes = (LimitedJSONParser, FormParser, MultiPartParser)
+    private = True
+    search_limit = settings.RECIPE_SEARCH_LIMIT
+
+    def get_validators(self, queryset):
+        # Recipe pages carry per-user flags, nested authors, tags and
+        # ingredients, so they are validated by version tokens instead of
+        # querying the table; the tokens also keep keyset pages count-free.
+        user = self.request.user
+        return (
+            (
+                self.request.get_full_path(),
+                user.id,
+                get_version(f'flags:{user.id}') if user.is_authenticated
+                else '',
+                get_version('recipes'),
+                get_version('ingredients'),
+                get_version('tags'),
+                get_version('users'),
+            ),
+            None,
+        )
 
     def get_queryset(self):
-        queryset = Recipe.objects.prefetch_related(
-            'recipeingredient_set__ingredient',
-            'tags',
+        # Tags and ingredients themselves are resolved by the serializer
+        # from the in-process dimension tables.
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.only(
+                    'recipe', 'ingredient', 'amount',
+                ),
+            ),
         )
         data = self.request.query_params
+        user = self.request.user
 
-        if data.get('is_favorited'):
-            if data['is_favorited'] == '0':
-                queryset = queryset.exclude(
-                    favorited_by=self.request.user.id
-                )
-            else:
+        # Every filter is a semi-join (EXISTS or IN over a subquery) rather
+        # than a join, so rows are never multiplied and no DISTINCT is
+        # needed on top of the `-id` ordering. Positive flag filters use IN
+        # so the planner can drive from the user's few flag rows instead of
+        # probing every recipe.
+        flags = {
+            'is_favorited': user.favorite_set,
+            'is_in_shopping_cart': user.shoppingcart_set,
+        } if user.is_authenticated else {}
+        queryset = queryset.annotate(**{
+            flag: Exists(rows.filter(recipe=OuterRef('id')))
+            for flag, rows in flags.items()
+        })
+
+        for flag in ('is_favorited', 'is_in_shopping_cart'):
+            if not data.get(flag):
+                continue
+            value = data[flag] != '0'
+            if flag not in flags:
+                if value:
+                    return Recipe.objects.none()
+            elif value:
                 queryset = queryset.filter(
-                    favorited_by__in=(self.request.user.id,),
-                )
-
-        if data.get('is_in_shopping_cart'):
-            if data['is_in_shopping_cart'] == '0':
-                queryset = queryset.exclude(
-                    in_shopping_cart=self.request.user.id
+                    id__in=flags[flag].values('recipe'),
                 )
             else:
-                queryset = queryset.filter(
-                    in_shopping_cart__in=(self.request.user.id,),
-                )
+                queryset = queryset.filter(**{flag: False})
 
         if data.get('author'):
             try:
@@ -77,30 +132,167 @@ class RecipeViewSet(ModelViewSet):
             queryset = queryset.filter(author=data['author'])
 
         if data.get('tags'):
-            queryset = queryset.filter(tags__slug__in=data.getlist('tags'))
-
-        user = self.request.user
+            queryset = queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('id'),
+                    tag__slug__in=data.getlist('tags'),
+                )
+            ))
 
-        is_favorited = user.favorite_set.filter(
-            recipe=OuterRef('id'),
-        )
-        is_in_shopping_cart = user.shoppingcart_set.filter(
-            recipe=OuterRef('id'),
-        )
-        queryset = queryset.annotate(
-            is_favorited=Exists(is_favorited),
-            is_in_shopping_cart=Exists(is_in_shopping_cart),
-        ).distinct()
         return queryset
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipePostSerializer
+        if self.action in ('list', 'retrieve', 'feed', 'search', 'cookable'):
+            return FastRecipeSerializer
         return RecipeSerializer
 
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+
+        def get_response():
+            key = recipe_list_cache_key(request)
+            data = cache.get(key)
+            if data is not None:
+                metrics.increment('recipes_list_cache_hit')
+                return Response(data)
+
+            metrics.increment('recipes_list_cache_miss')
+            response = super(ConditionalMixin, self).list(
+                request, *args, **kwargs
+            )
+            if response.status_code == HTTPStatus.OK:
+                cache.set(
+                    key,
+                    response.data,
+                    settings.RECIPE_LIST_CACHE_TIMEOUT,
+                )
+            return response
+
+        # Cache hits get the same ETag handling as misses.
+        return self.conditional_response(
+            self.filter_queryset(self.get_queryset()),
+            get_response,
+        )
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Recipes of followed authors, newest first."""
+        paginator = KeysetPagination()
+        queryset = self.get_queryset().filter(
+            author__in=request.user.following.values('author'),
+        )
+
+        def get_page():
+            # The cached ids know nothing about filters, so only plain
+            # pages are cut from them.
+            ids = None
+            if set(request.query_params) <= {'limit', 'before'}:
+                ids = feed.get_recipe_ids(request.user)
+            if ids is not None:
+                ids = feed.get_page_ids(
+                    ids,
+                    paginator.get_position(request),
+                    paginator.get_page_size(request) + 1,
+                )
+            if ids is not None:
+                page = paginator.paginate_queryset(
+                    queryset.filter(id__in=ids),
+                    request,
+                )
+                # A cached id whose recipe is gone would cut the page
+                # short and hide the next link.
+                if paginator.fetched == len(ids):
+                    metrics.increment('recipes_feed_cache_hit')
+                    return page
+            return paginator.paginate_queryset(queryset, request)
+
+        def get_response():
+            serializer = self.get_serializer(get_page(), many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+        return self.conditional_response(queryset, get_response)
+
+    @action(detail=False)
+    def search(self, request):
+        """Recipes matching `q` by name, ingredients or text, best first.
+
+        The other recipe filters apply to the best matches.
+        """
+        text = request.query_params.get('q', '')
+
+        def get_response():
+            ids = get_recipe_search_engine().search(
+                text,
+                self.get_search_limit(),
+            ) if text.strip() else []
+            serializer = self.get_serializer(
+                self.get_ranked_recipes(ids),
+                many=True,
+            )
+            return Response(serializer.data)
+
+        return self.conditional_response(self.get_queryset(), get_response)
+
+    @action(detail=False)
+    def cookable(self, request):
+        """Recipes best covered by the `ingredients` on hand.
+
+        Every recipe carries the share of its ingredients that is on hand
+        and the ids of the missing ones.
+        """
+        try:
+            ingredient_ids = [
+                int(id) for id in request.query_params.getlist('ingredients')
+            ]
+        except ValueError:
+            raise exceptions.InvalidIdsException()
+        try:
+            min_coverage = float(request.query_params['min_coverage'])
+        except (KeyError, ValueError):
+            min_coverage = 0
+
+        def get_response():
+            matches = {
+                recipe_id: (coverage, missing)
+                for recipe_id, coverage, missing in pantry.index.search(
+                    ingredient_ids,
+                    self.get_search_limit(),
+                    min_coverage,
+                )
+            } if ingredient_ids else {}
+            data = self.get_serializer(
+                self.get_ranked_recipes(list(matches)),
+                many=True,
+            ).data
+            for item in data:
+                coverage, missing = matches[item['id']]
+                item['coverage'] = round(coverage, 3)
+                item['missing_ingredients'] = missing
+            return Response(data)
+
+        return self.conditional_response(self.get_queryset(), get_response)
+
+    def get_ranked_recipes(self, ids):
+        """Recipes with the given ids that pass the filters, in order."""
+        positions = {id: position for position, id in enumerate(ids)}
+        return sorted(
+            self.get_queryset().filter(id__in=ids),
+            key=lambda recipe: positions[recipe.id],
+        )
+
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        shopping_cart.invalidate_recipe(instance.id)
+        feed.recipe_deleted(instance)
+        instance.delete()
+        change_recipes_count(instance.author_id, -1)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -132,17 +324,31 @@ class RecipeViewSet(ModelViewSet):
         return Response(instance_serializer.data)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ConditionalMixin,
+    SearchLimitMixin,
+    ReadOnlyModelViewSet,
+):
     pagination_class = None
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    queryset = Ingredient.objects.all()
+    queryset = Ingredient.objects.defer('updated_at')
     serializer_class = IngredientSerializer
+    search_limit = settings.INGREDIENT_SEARCH_LIMIT
 
-    def get_queryset(self):
-        name = self.request.query_params.get('name')
-        if name:
-            return Ingredient.objects.filter(name__istartswith=name).all()
-        return Ingredient.objects.all()
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+
+        def get_response():
+            ingredients = get_search_engine().search(
+                name,
+                self.get_search_limit(),
+            )
+            serializer = self.get_serializer(ingredients, many=True)
+            return Response(serializer.data)
+
+        return self.conditional_response(self.get_queryset(), get_response)
 
 
 class FlagView(APIView):
@@ -150,35 +356,53 @@ class FlagView(APIView):
     duplicate_exception = None
     doesnt_exist_exception = None
     target_model = Recipe
-    target_serializer = RecipeShortSerializer
+    target_field = 'recipe'
+    target_serializer = FastRecipeShortSerializer
+    counter_field = None
 
     def get_target(self, id):
         return get_object_or_404(self.target_model, id=id)
 
-    def exists(self, user, target):
-        return self.model.objects.filter(
-            user=user,
-            recipe=target,
-        ).exists()
+    def change_counter(self, target_ids, delta):
+        if self.counter_field:
+            change_recipe_counter(target_ids, self.counter_field, delta)
+
+    def flags_changed(self, user):
+        # Recipe representations carry per-user flags, so their ETags
+        # include this version.
+        transaction.on_commit(lambda: bump_version(f'flags:{user.id}'))
 
     def save(self, user, target):
-        self.model(
-            user=user,
-            recipe=target,
-        ).save()
+        # The unique constraint decides whether the flag is already set,
+        # so concurrent requests cannot both insert it.
+        try:
+            with transaction.atomic():
+                self.model.objects.create(
+                    user=user,
+                    **{self.target_field: target},
+                )
+                self.change_counter([target.id], 1)
+                self.flags_changed(user)
+        except IntegrityError:
+            raise self.duplicate_exception()
 
-    def delete_object(self, user, target):
-        self.model.objects.get(
-            user=user,
-            recipe=target,
-        ).delete()
+    def delete_object(self, user, target_id):
+        with transaction.atomic():
+            deleted, _ = self.model.objects.filter(
+                user=user,
+                **{f'{self.target_field}_id': target_id},
+            ).delete()
+            if deleted:
+                self.change_counter([target_id], -1)
+                self.flags_changed(user)
+        if not deleted:
+            # Tell a missing target apart from a flag that is not set.
+            self.get_target(target_id)
+            raise self.doesnt_exist_exception()
 
     def post(self, request, id):
         target = self.get_target(id)
-        user = request.user
-        if self.exists(user, target):
-            raise self.duplicate_exception()
-        self.save(user, target)
+        self.save(request.user, target)
         return Response(
             self.target_serializer(
                 target,
@@ -188,11 +412,7 @@ class FlagView(APIView):
         )
 
     def delete(self, request, id):
-        target = self.get_target(id)
-        user = request.user
-        if not self.exists(user, target):
-            raise self.doesnt_exist_exception()
-        self.delete_object(user, target)
+        self.delete_object(request.user, id)
         return Response(
             status=HTTPStatus.NO_CONTENT,
         )
@@ -202,30 +422,141 @@ class FavoriteView(FlagView):
     model = Favorite
     duplicate_exception = exceptions.AlreadyFavoriteException
     doesnt_exist_exception = exceptions.NotFavoriteException
+    counter_field = 'favorites_count'
 
 
 class ShoppingCartView(FlagView):
     model = ShoppingCart
     duplicate_exception = exceptions.AlreadyInShoppingCart
     doesnt_exist_exception = exceptions.NotInCartException
+    counter_field = 'cart_count'
+
+    def flags_changed(self, user):
+        super().flags_changed(user)
+        transaction.on_commit(lambda: shopping_cart.invalidate(user.id))
+
+
+class BulkFlagView(APIView):
+    """Set or clear a flag for a list of targets in one request.
+
+    Takes `{"ids": [...]}` and answers with a status for every id instead
+    of failing the whole request on the first one that cannot change.
+    Subclasses mix in the single target view they batch.
+    """
+
+    def get_ids(self, request):
+        serializer = IdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def filter_flags(self, user, ids):
+        return self.model.objects.filter(
+            user=user,
+            **{f'{self.target_field}_id__in': ids},
+        )
+
+    @staticmethod
+    def get_statuses(ids, changed, status, unchanged, unchanged_status):
+        return [
+            {
+                'id': id,
+                'status': (
+                    status if id in changed
+                    else unchanged_status if id in unchanged
+                    else 'not_found'
+                ),
+            }
+            for id in ids
+        ]
+
+    def add(self, user, ids):
+        with transaction.atomic():
+            flagged = set(self.filter_flags(user, ids).values_list(
+                f'{self.target_field}_id',
+                flat=True,
+            ))
+            created = list(self.target_model.objects.filter(
+                id__in=[id for id in ids if id not in flagged],
+            ).values_list('id', flat=True))
+            if created:
+                self.model.objects.bulk_create(
+                    self.model(
+                        user=user,
+                        **{f'{self.target_field}_id': id},
+                    )
+                    for id in created
+                )
+                self.change_counter(created, 1)
+                self.flags_changed(user)
+        return self.get_statuses(
+            ids,
+            set(created),
+            'created',
+            flagged,
+            self.duplicate_exception.default_code,
+        )
+
+    def remove(self, user, ids):
+        with transaction.atomic():
+            # Locking the rows keeps a concurrent request from deleting
+            # them in between, which would make the counters drift.
+            deleted = list(self.filter_flags(user, ids).select_for_update(
+            ).values_list(f'{self.target_field}_id', flat=True))
+            if deleted:
+                self.filter_flags(user, deleted).delete()
+                self.change_counter(deleted, -1)
+                self.flags_changed(user)
+        deleted = set(deleted)
+        remaining = [id for id in ids if id not in deleted]
+        found = set(self.target_model.objects.filter(
+            id__in=remaining,
+        ).values_list('id', flat=True)) if remaining else ()
+        return self.get_statuses(
+            ids,
+            deleted,
+            'deleted',
+            found,
+            self.doesnt_exist_exception.default_code,
+        )
+
+    def post(self, request):
+        ids = self.get_ids(request)
+        try:
+            statuses = self.add(request.user, ids)
+        except IntegrityError:
+            # A concurrent request set some of the flags in between, the
+            # second attempt sees them as already set.
+            statuses = self.add(request.user, ids)
+        return Response({'results': statuses})
+
+    def delete(self, request):
+        return Response({
+            'results': self.remove(request.user, self.get_ids(request)),
+        })
+
+
+class BulkFavoriteView(BulkFlagView, FavoriteView):
+    pass
+
+
+class BulkShoppingCartView(BulkFlagView, ShoppingCartView):
+    pass
 
 
 class ShoppingCartDownload(APIView):
     def get(self, request):
-        ingredients = Ingredient.objects.filter(
-            recipes__in_shopping_cart=self.request.user.id,
-        ).annotate(amount=Sum('recipeingredient__amount'))
-
-        shopping_cart = '\n'.join(
-            f'{i.name}, {i.amount} {i.measurement_unit}'
-            for i in ingredients
-        ) + '\n'
-        response = HttpResponse(
-            shopping_cart,
-            content_type='text/plain',
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in shopping_cart.FORMATS:
+            raise exceptions.UnknownFileFormatException()
+        content_type, render = shopping_cart.FORMATS[file_format]
+
+        rows = shopping_cart.get_cached_shopping_cart(request.user)
+        response = StreamingHttpResponse(
+            render(rows),
+            content_type=content_type,
         )
         response['Content-Disposition'] = (
-            'attachment; filename=ShoppingCart.txt'
+            f'attachment; filename=ShoppingCart.{file_format}'
         )
         return response
 
@@ -235,35 +566,82 @@ class FollowView(FlagView):
     duplicate_exception = exceptions.AlreadyFollowingException
     doesnt_exist_exception = exceptions.NotFollowingException
     target_model = User
+    target_field = 'author'
     target_serializer = FoodgramUserWithRecipesSerializer
 
-    def exists(self, user, target):
-        return self.model.objects.filter(
-            user=user,
-            author=target,
-        ).exists()
+    def flags_changed(self, user):
+        super().flags_changed(user)
+        transaction.on_commit(lambda: feed.invalidate(user.id))
 
-    def save(self, user, target):
-        self.model(
-            user=user,
-            author=target,
-        ).save()
 
-    def delete_object(self, user, target):
-        self.model.objects.get(
-            user=user,
-            author=target,
-        ).delete()
+class BulkFollowView(BulkFlagView, FollowView):
+    pass
 
 
 class FollowGetView(OnlyListViewset):
     model = User
     serializer_class = FoodgramUserWithRecipesSerializer
+    pagination_class = PageOrCursorPagination
+
+    def get_recipes_queryset(self):
+        recipes = Recipe.objects.only(
+            'id',
+            'author',
+            'name',
+            'image',
+            'image_variants',
+            'cooking_time',
+        )
+        limit = get_recipes_limit(self.request)
+        if limit is None:
+            return recipes
+
+        # Number recipes of every followed author newest first and keep
+        # only the first `limit` of each, so the prefetch is one query
+        # bounded by the page size rather than by how prolific authors are.
+        ranked = Recipe.objects.filter(
+            author__followers__user=self.request.user,
+        ).annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=F('id').desc(),
+            ),
+        ).order_by().values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return recipes.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE recipe_rank <= %s',
+            (*params, limit),
+        ))
 
     def get_queryset(self):
         queryset = User.objects.prefetch_related(
-            'recipes',
+            Prefetch(
+                'recipes',
+                queryset=self.get_recipes_queryset(),
+                to_attr='prefetched_recipes',
+            ),
         )
         queryset = queryset.filter(followers__user__in=(self.request.user,))
-        queryset = queryset.annotate(recipes_count=Count('recipes'))
+        queryset = queryset.annotate(
+            recipes_count=Coalesce('stats__recipes_count', 0),
+            is_subscribed=Value(True),
+        )
         return queryset
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+class PrometheusMetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
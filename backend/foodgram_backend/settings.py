@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework.authtoken',
     'rest_framework',
     'api',
@@ -30,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +83,112 @@ DATABASES = {
 DATABASES['default'] = DATABASES['dev' if DEBUG else 'production']
 
 
+# Cache
+
+# Cached carts, pages and the version tokens invalidating them have to be
+# seen by every worker and management command, so the default is a file
+# cache; local memory is per process and only fits a single worker.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram-cache'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10_000)),
+        },
+    },
+}
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+RECIPE_LIST_CACHE_TIMEOUT = 5 * 60
+
+# Newest recipe ids of followed authors, kept per user and pushed to on
+# recipe creation.
+FEED_FANOUT = os.getenv('FEED_FANOUT', 'True') == 'True'
+FEED_CACHE_SIZE = 200
+FEED_CACHE_TIMEOUT = 15 * 60
+
+# Ingredient autocomplete
+
+INGREDIENT_SEARCH_ENGINE = os.getenv(
+    'INGREDIENT_SEARCH_ENGINE',
+    'api.autocomplete.IngredientIndex',
+)
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Recipe search
+
+RECIPE_SEARCH_ENGINE = os.getenv(
+    'RECIPE_SEARCH_ENGINE',
+    'api.search.RecipeIndex' if DEBUG else 'api.search.DatabaseRecipeSearch',
+)
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_LIMIT = 50
+
+# Bulk favorite, shopping cart and subscribe requests
+
+MAX_BULK_IDS = 100
+
+# Uploads
+
+MAX_IMAGE_UPLOAD_SIZE = int(os.getenv('MAX_IMAGE_UPLOAD_SIZE', 10 * 2 ** 20))
+MAX_IMAGE_SIDE = 8000
+# JSON recipe bodies only, other requests keep Django's
+# DATA_UPLOAD_MAX_MEMORY_SIZE. Base64 inflates the image by a third, the
+# rest of a recipe is small.
+MAX_RECIPE_BODY_SIZE = MAX_IMAGE_UPLOAD_SIZE * 4 // 3 + 2 ** 20
+
+# Recipe image variants
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'WEBP')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+
+# Query inspection
+
+QUERY_INSPECTION_SAMPLE_RATE = float(
+    os.getenv('QUERY_INSPECTION_SAMPLE_RATE', 1 if DEBUG else 0.01)
+)
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+DUPLICATE_QUERY_THRESHOLD = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'api.log.JsonFormatter'},
+    },
+    'handlers': {
+        'queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.getenv(
+                'QUERY_LOG_FILE', BASE_DIR / 'queries.log',
+            ),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'api.queries': {
+            'handlers': ['queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
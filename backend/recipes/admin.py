@@ -45,6 +45,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'author',
         'text',
+        'favorites_count',
     )
     search_fields = (
         'name',
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import AuthorStats, Favorite, Recipe, ShoppingCart
+
+
+def change_recipe_counter(recipe_ids, field, delta):
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        **{field: F(field) + delta},
+    )
+
+
+def change_recipes_count(author_id, delta):
+    updated = AuthorStats.objects.filter(author_id=author_id).update(
+        recipes_count=F('recipes_count') + delta,
+    )
+    if updated:
+        return
+    _, created = AuthorStats.objects.get_or_create(
+        author_id=author_id,
+        defaults={'recipes_count': max(delta, 0)},
+    )
+    if not created:
+        # Another request created the row between our update and insert.
+        change_recipes_count(author_id, delta)
+
+
+def _count_per_recipe(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                recipe=OuterRef('id'),
+            ).order_by().values('recipe').annotate(
+                count=Count('id'),
+            ).values('count')
+        ),
+        0,
+    )
+
+
+@transaction.atomic
+def recompute_counters():
+    """Rebuild every denormalized counter from the source tables."""
+    recipes = Recipe.objects.update(
+        favorites_count=_count_per_recipe(Favorite),
+        cart_count=_count_per_recipe(ShoppingCart),
+    )
+    AuthorStats.objects.all().delete()
+    authors = AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(author_id=row['author'], recipes_count=row['count'])
+            for row in Recipe.objects.order_by().values('author').annotate(
+                count=Count('id'),
+            )
+        ),
+        batch_size=1000,
+    )
+    return recipes, len(authors)
@@ -0,0 +1,37 @@
+from django.contrib.postgres.indexes import OpClass
+from django.db import models
+
+
+class PortableGinIndex(models.Index):
+    """GIN index on PostgreSQL and a plain index on other databases.
+
+    Keeps the models usable with the SQLite development database, where
+    the indexed column is left empty anyway.
+    """
+
+    suffix = 'gin'
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            using = ' USING gin'
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
+class PortablePatternIndex(models.Index):
+    """Expression index serving `LIKE 'prefix%'` on any database.
+
+    PostgreSQL only uses a btree index for such patterns under the C
+    collation or with a pattern operator class, which is added there.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        index = self
+        if schema_editor.connection.vendor == 'postgresql':
+            index = self.clone()
+            index.expressions = tuple(
+                OpClass(expression, name='text_pattern_ops')
+                for expression in self.expressions
+            )
+        return models.Index.create_sql(
+            index, model, schema_editor, using=using, **kwargs,
+        )
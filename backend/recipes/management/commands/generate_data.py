@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_version
+from recipes.seed import (DEFAULT_INGREDIENTS, SEED_PASSWORD,
+                          ensure_seed_image, seed_database)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic users, recipes, follows, favorites and '
+        'shopping carts with bulk inserts for local load testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--recipes', type=int, default=50_000)
+        parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ensure_seed_image()
+        summary = seed_database(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients_path=options['ingredients'],
+            follows_per_user=options['follows_per_user'],
+            favorites_per_user=options['favorites_per_user'],
+            cart_per_user=options['cart_per_user'],
+            seed=options['seed'],
+        )
+        for name in ('ingredients', 'tags', 'recipes'):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            'Generated ' + ', '.join(
+                f'{count} {name}' for name, count in summary.items()
+            ) + f' in {time.perf_counter() - start:.1f} s. '
+            f'Every generated user has the password "{SEED_PASSWORD}".'
+        ))
@@ -0,0 +1,140 @@
+import csv
+import json
+import re
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.cache import bump_version
+from recipes.models import Ingredient, Tag
+
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+FIXTURE_MODELS = {
+    'recipes.ingredient': Ingredient,
+    'recipes.tag': Tag,
+}
+
+
+def iter_json_array(file):
+    """Yield items of a top level JSON array without loading the file."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Expected a JSON array.')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Malformed JSON array.')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) == 2:
+            yield Ingredient, {'name': row[0], 'measurement_unit': row[1]}
+
+
+def read_json(file):
+    for item in iter_json_array(file):
+        if 'model' not in item:
+            yield Ingredient, item
+        elif item['model'] in FIXTURE_MODELS:
+            yield FIXTURE_MODELS[item['model']], item['fields']
+        else:
+            raise CommandError(f'Unsupported fixture model {item["model"]}.')
+
+
+def insert_ignore(model, batch):
+    """Insert plain field dicts, skipping rows that break a constraint.
+
+    This is what `bulk_create(ignore_conflicts=True)` does, minus building
+    a model instance and preparing every value through the ORM, which is
+    most of the cost when importing hundreds of thousands of rows.
+    """
+    names = list(batch[0])
+    values = [tuple(fields[name] for name in names) for fields in batch]
+    if any(field.name == 'updated_at' for field in model._meta.fields):
+        names.append('updated_at')
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        values = [row + (now,) for row in values]
+
+    operations = connection.ops
+    fields = [model._meta.get_field(name) for name in names]
+    columns = ', '.join(
+        operations.quote_name(field.column) for field in fields
+    )
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    size = operations.bulk_batch_size(fields, values) or len(values)
+    suffix = operations.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), size):
+            rows = values[start:start + size]
+            cursor.execute(
+                f'{operations.insert_statement(ignore_conflicts=True)} '
+                f'{operations.quote_name(model._meta.db_table)} ({columns}) '
+                f'VALUES {", ".join([placeholders] * len(rows))} {suffix}',
+                [value for row in rows for value in row],
+            )
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports ingredients and tags from CSV, JSON lists and fixtures '
+        'with batched inserts, skipping rows that already exist.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            reader = {'.csv': read_csv, '.json': read_json}.get(path.suffix)
+            if reader is None:
+                raise CommandError(f'Unsupported file type: {path}')
+            start = time.perf_counter()
+            with open(path, encoding='utf-8', newline='') as file:
+                counts = self.load(reader(file), options['batch_size'])
+            elapsed = time.perf_counter() - start
+            total = sum(counts.values())
+            self.stdout.write(self.style.SUCCESS(
+                f'{path}: {total} rows processed in {elapsed:.2f} s '
+                f'({total / max(elapsed, 1e-9):.0f} rows/s) '
+                + ', '.join(
+                    f'{model._meta.verbose_name_plural}: {count}'
+                    for model, count in counts.items()
+                )
+            ))
+        bump_version('ingredients')
+        bump_version('tags')
+
+    def load(self, rows, batch_size):
+        counts = {}
+        rows = iter(rows)
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                batches = {}
+                for model, fields in chunk:
+                    batches.setdefault(model, []).append(fields)
+                for model, batch in batches.items():
+                    insert_ignore(model, batch)
+                    counts[model] = counts.get(model, 0) + len(batch)
+        return counts
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recompute_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes favorites, shopping cart and author recipe counters '
+        'from the source tables.'
+    )
+
+    def handle(self, *args, **options):
+        recipes, authors = recompute_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed counters of {recipes} recipes and {authors} authors.'
+        ))
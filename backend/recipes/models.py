@@ -1,7 +1,11 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
+
+from recipes.indexes import PortableGinIndex, PortablePatternIndex
 
 User = get_user_model()
 
@@ -22,6 +26,10 @@ class Tag(models.Model):
         max_length=200,
         unique=True,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Тэг'
@@ -41,16 +49,40 @@ class Ingredient(models.Model):
         'Единица измерения',
         max_length=200,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        indexes = [
+            # Serves the case-insensitive prefix tier of the ingredient
+            # search, which PostgreSQL runs as UPPER(name) LIKE 'Q%'.
+            PortablePatternIndex(
+                Upper('name'),
+                name='ingredient_name_upper_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeManager(models.Manager):
+    def get_queryset(self):
+        # The search vector is only ever read by the database itself.
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(Tag)
     author = models.ForeignKey(
@@ -69,6 +101,12 @@ class Recipe(models.Model):
         'Картинка',
         upload_to="recipes/images/",
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         'Текст рецепта',
     )
@@ -89,12 +127,39 @@ class Recipe(models.Model):
         through='ShoppingCart',
         related_name='shopping_cart',
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    cart_count = models.PositiveIntegerField(
+        'Добавлений в корзину',
+        default=0,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый индекс',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ['-id']
+        indexes = [
+            PortableGinIndex(
+                fields=('search_vector',),
+                name='recipe_search_idx',
+            ),
+        ]
 
     def __str__(self):
         return str(self.name)
@@ -183,3 +248,21 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Автор',
+        related_name='stats',
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
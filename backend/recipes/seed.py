@@ -0,0 +1,236 @@
+import base64
+import csv
+import random
+from contextlib import contextmanager
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from recipes.counters import recompute_counters
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag, User)
+
+SEED_PASSWORD = 'seed-password'
+THROWAWAY_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throwaway',
+    },
+}
+SEED_IMAGE = 'recipes/images/seed.png'
+SEED_IMAGE_CONTENT = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAACVBMVEUAAAD///9fX1/S'
+    '0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJ'
+    'RU5ErkJggg=='
+)
+BATCH_SIZE = 1000
+
+DEFAULT_INGREDIENTS = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+DEFAULT_TAGS = (
+    ('завтрак', '#EDDA42', 'breakfast'),
+    ('обед', '#2B2DAA', 'lunch'),
+    ('ужин', '#6B11BA', 'dinner'),
+    ('десерт', '#F1A5C0', 'dessert'),
+)
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a fresh test database dropped afterwards.
+
+    The block also gets a cache of its own, so entries cached for the real
+    database are neither read nor dropped.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(CACHES=THROWAWAY_CACHES):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def ensure_seed_image():
+    """Store the placeholder image every seeded recipe points to."""
+    if not default_storage.exists(SEED_IMAGE):
+        default_storage.save(SEED_IMAGE, ContentFile(SEED_IMAGE_CONTENT))
+
+
+def read_ingredients(path=DEFAULT_INGREDIENTS):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) == 2:
+                yield row[0], row[1]
+
+
+def _popularity(count):
+    # A few very popular items and a long tail of rarely used ones.
+    weights = accumulate(1 / rank for rank in range(1, count + 1))
+    return list(weights)
+
+
+def _popular_sample(rng, population, cum_weights, k):
+    k = min(k, len(population))
+    chosen = set()
+    while len(chosen) < k:
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=k - len(chosen),
+        ))
+    return chosen
+
+
+def _unique_pairs(rng, left, right, per_left, exclude_self=False):
+    cum_weights = _popularity(len(right))
+    for item in left:
+        for other in _popular_sample(rng, right, cum_weights, per_left):
+            if not (exclude_self and other == item):
+                yield item, other
+
+
+@transaction.atomic
+def seed_database(
+    users=2000,
+    recipes=5000,
+    ingredients_path=DEFAULT_INGREDIENTS,
+    ingredients_per_recipe=(3, 12),
+    follows_per_user=10,
+    favorites_per_user=10,
+    cart_per_user=5,
+    seed=0,
+):
+    """Fill the database with a reproducible synthetic dataset.
+
+    Popularity follows a Zipf-like law everywhere: a few authors write
+    most recipes and get most followers, a few ingredients and recipes
+    are used, favorited and added to carts far more than the rest.
+    Existing rows are kept, so the function can top up a database.
+    """
+    rng = random.Random(seed)
+    last_user = User.objects.order_by('-id').values_list('id', flat=True)
+    last_user = last_user.first() or 0
+    last_recipe = Recipe.objects.order_by('-id').values_list('id', flat=True)
+    last_recipe = last_recipe.first() or 0
+
+    Tag.objects.bulk_create(
+        (
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in DEFAULT_TAGS
+        ),
+        ignore_conflicts=True,
+    )
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in read_ingredients(ingredients_path)
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    rng.shuffle(ingredient_ids)
+    ingredient_weights = _popularity(len(ingredient_ids))
+
+    password = make_password(SEED_PASSWORD)
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'user{last_user + number}',
+                email=f'user{last_user + number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(users)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.filter(
+        id__gt=last_user,
+    ).order_by('id').values_list('id', flat=True))
+
+    authors = rng.choices(
+        user_ids,
+        cum_weights=_popularity(len(user_ids)),
+        k=recipes,
+    )
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=author,
+                name=f'Рецепт {number}',
+                image=SEED_IMAGE,
+                text='Описание рецепта. ' * rng.randint(1, 20),
+                cooking_time=rng.randint(5, 180),
+            )
+            for number, author in enumerate(authors)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    recipe_ids = list(Recipe.objects.filter(
+        id__gt=last_recipe,
+    ).values_list('id', flat=True))
+
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(
+                recipe_id=recipe,
+                ingredient_id=ingredient,
+                amount=rng.randint(1, 500),
+            )
+            for recipe in recipe_ids
+            for ingredient in _popular_sample(
+                rng,
+                ingredient_ids,
+                ingredient_weights,
+                rng.randint(*ingredients_per_recipe),
+            )
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipe_ids
+            for tag in rng.sample(tag_ids, rng.randint(1, 2))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Follow.objects.bulk_create(
+        (
+            Follow(user_id=user, author_id=author)
+            for user, author in _unique_pairs(
+                rng, user_ids, user_ids, follows_per_user, exclude_self=True,
+            )
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    for model, per_user in (
+        (Favorite, favorites_per_user),
+        (ShoppingCart, cart_per_user),
+    ):
+        model.objects.bulk_create(
+            (
+                model(user_id=user, recipe_id=recipe)
+                for user, recipe in _unique_pairs(
+                    rng, user_ids, recipe_ids, per_user,
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    recompute_counters()
+
+    return {
+        'users': len(user_ids),
+        'recipes': len(recipe_ids),
+        'ingredients': len(ingredient_ids),
+        'tags': len(tag_ids),
+    }